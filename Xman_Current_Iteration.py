@@ -1,8 +1,24 @@
-import keyboard
+import argparse
+import atexit
+import collections
+import gc
+import gzip
+import heapq
+import json
+import math
+import mmap
+import multiprocessing
 import os
+import signal
+import threading
 import time
+import tracemalloc
 import random
+import selectors
+import socket
+import struct
 import sys
+from multiprocessing import shared_memory
 
 # ========================
 # Config
@@ -25,28 +41,594 @@ class Colors:
     UNDERLINE = '\033[4m'
     DARK = '\033[90m'
 
+# 256-colour equivalents of the bright 16-colour codes above
+COLORS_256 = {"HEADER": 213, "OKBLUE": 75, "OKCYAN": 51, "OKGREEN": 46,
+              "WARNING": 226, "FAIL": 196, "DARK": 244}
+
+def detect_color_mode():
+    """Pick 'mono' or '16' for the terminal. '256' is never guessed: its codes
+    are twice as long as the 16-colour ones for the same palette"""
+    term = os.environ.get("TERM", "")
+    if "NO_COLOR" in os.environ or term == "dumb":
+        return "mono"
+    return "16"
+
+def set_color_mode(mode):
+    """Rewrite Colors in place so every scene follows the chosen mode"""
+    if mode == "mono":
+        for name in vars(Colors):
+            if not name.startswith("_"):
+                setattr(Colors, name, "")
+    elif mode == "256":
+        for name, code in COLORS_256.items():
+            setattr(Colors, name, f"\033[38;5;{code}m")
+
+class FrameEncoder:
+    """Turns rows of (char, colour) cells into text, emitting a colour code only
+    when the colour actually changes, and keeps byte counts per frame"""
+    def __init__(self):
+        self.frames = 0
+        self.total_bytes = 0
+        self.last_frame_bytes = 0
+
+    def encode(self, rows):
+        parts = []
+        current = ""
+        for row in rows:
+            for char, color in row:
+                if color != current:
+                    parts.append(color or Colors.ENDC)
+                    current = color
+                parts.append(char)
+            parts.append("\n")
+        if current:
+            parts.append(Colors.ENDC)
+        frame = "".join(parts)
+        self.frames += 1
+        self.last_frame_bytes = len(frame.encode())
+        self.total_bytes += self.last_frame_bytes
+        return frame
+
+    def report(self):
+        average = self.total_bytes // self.frames if self.frames else 0
+        return f"Frame: {self.last_frame_bytes} bytes (avg {average} over {self.frames} frames)"
+
+board_encoder = FrameEncoder()
+show_frame_stats = False
+
+# ========================
+# I/O ports
+# ========================
+MOVE_KEYS = ('w', 's', 'a', 'd')
+UNDO_KEY = 'u'  # practice mode only
+BOARD_KEYS = MOVE_KEYS + (UNDO_KEY,)
+
+class InputPort:
+    """Where scenes read typed commands and the board reads movement keys"""
+    def read_line(self):
+        raise NotImplementedError
+
+    def poll_keys(self):
+        """Return the set of board keys (moves, undo) pressed right now"""
+        raise NotImplementedError
+
+    def flush(self):
+        """Drop any input typed ahead of the next prompt"""
+
+class TerminalInput(InputPort):
+    """Real keyboard and stdin (needs the keyboard module and root on Linux)"""
+    def __init__(self):
+        import keyboard
+        self.keyboard = keyboard
+
+    def read_line(self):
+        return input()
+
+    def poll_keys(self):
+        return {key for key in BOARD_KEYS if self.keyboard.is_pressed(key)}
+
+    def flush(self):
+        """Clear any pending keyboard input from buffer"""
+        if os.name == 'nt':  # Windows
+            import msvcrt
+            while msvcrt.kbhit():
+                msvcrt.getch()
+        else:  # Unix/Linux/Mac
+            import termios
+            termios.tcflush(sys.stdin, termios.TCIOFLUSH)
+
+class LineInput(InputPort):
+    """Base for ports fed whole lines; on the board a line like 'w' or 'wd' presses those keys"""
+    def poll_keys(self):
+        line = self.read_line().lower().strip()
+        if not all(char in BOARD_KEYS for char in line):
+            return set()  # a stray command, not key presses
+        return set(line)
+
+class ScriptedInput(LineInput):
+    """Queue of pre-recorded commands; raises EOFError when it runs dry"""
+    def __init__(self, commands=()):
+        self.commands = collections.deque(commands)
+
+    def read_line(self):
+        if not self.commands:
+            raise EOFError("command queue is empty")
+        return self.commands.popleft()
+
+class StreamInput(LineInput):
+    """Reads lines from any file-like object (pipe, sock.makefile('r'), ...)"""
+    def __init__(self, stream, output=None):
+        self.stream = stream
+        self.output = output  # flushed before each read so the other end sees what it is answering
+
+    def read_line(self):
+        if self.output is not None:
+            self.output.flush()
+        line = self.stream.readline()
+        if not line:
+            raise EOFError("input stream closed")
+        return line.rstrip("\r\n")
+
+class OutputPort:
+    """Where scenes draw text, clear the screen and pause for effect"""
+    def write(self, text="", end="\n"):
+        raise NotImplementedError
+
+    def prompt(self, text):
+        self.write(text, end="")
+
+    def clear(self):
+        pass
+
+    def pause(self, seconds):
+        pass
+
+class TerminalOutput(OutputPort):
+    def write(self, text="", end="\n"):
+        print(text, end=end)
+
+    def prompt(self, text):
+        print(text, end="", flush=True)
+
+    def clear(self):
+        os.system('cls' if os.name == 'nt' else 'clear')
+
+    def pause(self, seconds):
+        time.sleep(seconds)
+
+class StreamOutput(OutputPort):
+    """Writes to any file-like object; never sleeps so headless runs go full speed"""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text="", end="\n"):
+        self.stream.write(text + end)
+
+    def prompt(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+    def clear(self):
+        self.stream.write("\033[2J\033[H")
+
+class NullOutput(OutputPort):
+    """Discards everything"""
+    def write(self, text="", end="\n"):
+        pass
+
+def make_ports(args):
+    """Pick input/output ports from the parsed command line"""
+    if args.script:
+        with open(args.script) as f:
+            return ScriptedInput(line.rstrip("\n") for line in f), NullOutput()
+    if args.pipe:
+        return StreamInput(sys.stdin, sys.stdout), StreamOutput(sys.stdout)
+    return TerminalInput(), TerminalOutput()
+
+# Default ports; replaced in main
+game_input = ScriptedInput()
+game_output = NullOutput()
+
+# ========================
+# Event log
+# ========================
+# Column names for each event kind; emit() takes the values positionally
+EVENT_FIELDS = {
+    "kill":     ("enemy_type", "player_level"),
+    "loot":     ("source", "enemy_type", "gold", "xp"),
+    "purchase": ("item", "price", "gold_left"),
+    "equip":    ("weapon",),
+    "level_up": ("level", "max_health"),
+    "status":   ("target", "effect", "power", "turns"),
+    "dropped":  ("count",),  # written once at close if the ring ever overflowed
+}
+
+class EventLog:
+    """Preallocated ring buffer of gameplay events.
+
+    With a path, a background thread drains the ring in batches to gzip JSONL
+    and emit() drops (and counts) events rather than wait on a slow disk.
+    Without one, the ring just keeps the most recent events in memory.
+    """
+    def __init__(self, path=None, capacity=4096, flush_interval=1.0):
+        self.slots = [None] * capacity
+        self.capacity = capacity
+        self.head = 0  # next slot to fill; only the game thread moves it
+        self.tail = 0  # oldest unflushed slot; only the writer moves it
+        self.dropped = 0
+        self.flush_interval = flush_interval
+        self.file = None
+        self.writer = None
+        if path:
+            self.file = gzip.open(path, "ab")
+            self.stopping = threading.Event()
+            self.writer = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self.writer.start()
+            atexit.register(self.close)
+
+    def emit(self, kind, *values):
+        head = self.head
+        if head - self.tail >= self.capacity:
+            if self.writer is not None:
+                self.dropped += 1
+                return
+            self.tail += 1  # memory only: overwrite the oldest event
+        self.slots[head % self.capacity] = (time.time(), kind, values)
+        self.head = head + 1
+
+    def _record(self, slot):
+        stamp, kind, values = slot
+        record = {"t": round(stamp, 6), "event": kind}
+        record.update(zip(EVENT_FIELDS[kind], values))
+        return record
+
+    def _drain(self):
+        head = self.head
+        if head == self.tail:
+            return
+        lines = [json.dumps(self._record(self.slots[i % self.capacity])) for i in range(self.tail, head)]
+        self.tail = head
+        self.file.write(("\n".join(lines) + "\n").encode())
+        self.file.flush()
+
+    def _run(self):
+        while not self.stopping.wait(self.flush_interval):
+            self._drain()
+
+    def close(self):
+        if self.writer is None:
+            return
+        self.stopping.set()
+        self.writer.join()
+        self.writer = None
+        self._drain()
+        if self.dropped:
+            record = self._record((time.time(), "dropped", (self.dropped,)))
+            self.file.write((json.dumps(record) + "\n").encode())
+        self.file.close()
+
+# Default log keeps events in memory only; main may point it at a file
+event_log = EventLog()
+
+# ========================
+# Memory diagnostics
+# ========================
+def object_footprint(obj):
+    """Shallow size of an object, its __dict__ and the containers it holds directly"""
+    size = sys.getsizeof(obj) + sys.getsizeof(vars(obj))
+    for value in vars(obj).values():
+        if isinstance(value, (list, dict, str, tuple)):
+            size += sys.getsizeof(value)
+    return size
+
+def stack_depth():
+    depth = 0
+    frame = sys._getframe(1)
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+class MemoryProbe:
+    """tracemalloc sampling at scene transitions.
+
+    Each sample charges the allocations made since the previous one to the
+    scene that was running in between, so the report can list top allocation
+    sites per scene. Traced memory at each board sample is kept so steady
+    growth across turns can be flagged. Disabled probes cost one attribute check.
+    """
+    GROWTH_WINDOW = 20   # board samples that must all grow to flag a leak
+    TOP_SITES = 5
+
+    def __init__(self, path=None):
+        self.enabled = path is not None
+        self.path = path
+        self.scene = None
+        self.last_snapshot = None
+        self.samples = collections.Counter()
+        self.sites = {}       # scene -> Counter of "file:line" -> bytes allocated
+        self.board_memory = collections.deque(maxlen=self.GROWTH_WINDOW)
+        self.max_depth = 0
+        if self.enabled:
+            tracemalloc.start()
+            self.last_snapshot = self._snapshot()
+            atexit.register(self.write_report)
+            if hasattr(signal, "SIGUSR1"):
+                signal.signal(signal.SIGUSR1, lambda signum, frame: self.write_report())
+
+    def _snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def sample(self, scene):
+        if not self.enabled:
+            return
+        snapshot = self._snapshot()
+        if self.scene is not None:
+            sites = self.sites.setdefault(self.scene, collections.Counter())
+            for stat in snapshot.compare_to(self.last_snapshot, "lineno"):
+                if stat.size_diff > 0:
+                    frame = stat.traceback[0]
+                    sites[f"{frame.filename}:{frame.lineno}"] += stat.size_diff
+        self.last_snapshot = snapshot
+        self.scene = scene
+        self.samples[scene] += 1
+        self.max_depth = max(self.max_depth, stack_depth())
+        if scene == "board":
+            self.board_memory.append(tracemalloc.get_traced_memory()[0])
+
+    def growth_warning(self):
+        window = list(self.board_memory)
+        if len(window) < self.GROWTH_WINDOW:
+            return None
+        if all(later > earlier for earlier, later in zip(window, window[1:])):
+            return (f"traced memory grew on each of the last {self.GROWTH_WINDOW} board turns "
+                    f"(+{(window[-1] - window[0]) / 1024:.1f} KiB) - possible leak")
+        return None
+
+    def report(self):
+        current, peak = tracemalloc.get_traced_memory()
+        lines = ["X-Man memory report",
+                 "samples: " + ", ".join(f"{scene} {count}" for scene, count in self.samples.items()),
+                 f"traced memory: {current / 1024:.1f} KiB now, {peak / 1024:.1f} KiB peak",
+                 f"deepest stack at a scene change: {self.max_depth} frames"]
+        player = globals().get("Player_1")
+        enemies = globals().get("enemy_list") or []
+        if player is not None:
+            lines.append(f"Player: {object_footprint(player)} bytes")
+        if enemies:
+            average = sum(object_footprint(enemy) for enemy in enemies) // len(enemies)
+            lines.append(f"Enemy: {average} bytes each x {len(enemies)}")
+        counts = collections.Counter(type(obj).__name__ for obj in gc.get_objects())
+        lines.append("live objects: " + ", ".join(f"{name} {count}" for name, count in counts.most_common(10)))
+        lines.append("game objects: " + ", ".join(f"{name} {counts[name]}" for name in ("Player", "Enemy", "Shop", "StatusEffect")))
+        for scene, sites in self.sites.items():
+            lines.append(f"top allocation sites ({scene}):")
+            for site, size in sites.most_common(self.TOP_SITES):
+                lines.append(f"  {size / 1024:8.1f} KiB  {site}")
+        warning = self.growth_warning()
+        lines.append("growth: " + (warning or "no steady growth across board turns"))
+        return "\n".join(lines) + "\n"
+
+    def write_report(self):
+        """Write the summary to the report file; safe to call any time"""
+        if self.enabled:
+            with open(self.path, "w") as f:
+                f.write(self.report())
+
+# Disabled unless main turns it on
+memory_probe = MemoryProbe()
+
+# ========================
+# Live stats
+# ========================
+# Fixed little-endian layout: a header (magic, version, record size, sequence)
+# followed by one record. The sequence is odd while a write is in progress, so
+# a reader that sees it odd, or changed across its copy, just reads again.
+STATS_MAGIC = b"XMAN"
+STATS_VERSION = 1
+STATS_HEADER = struct.Struct("<4sHHQ")
+STATS_SEQUENCE = struct.Struct("<Q")
+STATS_SEQUENCE_OFFSET = 8
+STATS_ENEMY_TYPES = ("normal", "agile", "fire", "darkness")
+STATS_RECORD = struct.Struct("<QIIIiid" + "I" * len(STATS_ENEMY_TYPES))
+STATS_FIELDS = ("turn", "level", "gold", "kills", "health", "max_health", "frame_ms") + STATS_ENEMY_TYPES
+
+class LiveStats:
+    """Publishes the session's numbers into a memory-mapped file every turn.
+
+    Publishing packs a few integers into the mapping in place: no locks,
+    syscalls or serialization. Dashboards poll the file with read_live_stats.
+    Disabled stats cost one attribute check.
+    """
+    def __init__(self, path=None):
+        self.enabled = path is not None
+        self.sequence = 0
+        self.frame_seconds = 0.0
+        self.map = None
+        if self.enabled:
+            size = STATS_HEADER.size + STATS_RECORD.size
+            with open(path, "w+b") as f:
+                f.truncate(size)
+                self.map = mmap.mmap(f.fileno(), size)
+            STATS_HEADER.pack_into(self.map, 0, STATS_MAGIC, STATS_VERSION, STATS_RECORD.size, 0)
+            atexit.register(self.close)
+
+    def publish(self, turn, player, enemies, frame_seconds=None):
+        """Rewrite the record; without a frame time the last one is kept"""
+        if not self.enabled:
+            return
+        if frame_seconds is None:
+            frame_seconds = self.frame_seconds
+        self.frame_seconds = frame_seconds
+        alive = collections.Counter(enemy.enemy_type for enemy in enemies if not enemy.is_dead)
+        values = (turn, player.level, player.gold, player.enemies_killed, player.health, player.max_health,
+                  frame_seconds * 1000) + tuple(alive[kind] for kind in STATS_ENEMY_TYPES)
+        self.sequence += 1
+        STATS_SEQUENCE.pack_into(self.map, STATS_SEQUENCE_OFFSET, self.sequence)
+        STATS_RECORD.pack_into(self.map, STATS_HEADER.size, *values)
+        self.sequence += 1
+        STATS_SEQUENCE.pack_into(self.map, STATS_SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+def read_live_stats(path, retries=100):
+    """Consistent copy of a LiveStats file as a dict, or None if it kept changing"""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, version, size, _ = STATS_HEADER.unpack_from(data, 0)
+        if magic != STATS_MAGIC or version != STATS_VERSION or size != STATS_RECORD.size:
+            raise ValueError(f"{path} is not an X-Man stats file")
+        for _ in range(retries):
+            before = STATS_SEQUENCE.unpack_from(data, STATS_SEQUENCE_OFFSET)[0]
+            if before % 2:
+                continue
+            values = STATS_RECORD.unpack_from(data, STATS_HEADER.size)
+            if STATS_SEQUENCE.unpack_from(data, STATS_SEQUENCE_OFFSET)[0] == before:
+                return dict(zip(STATS_FIELDS, values), sequence=before)
+        return None
+    finally:
+        data.close()
+
+# Disabled unless main turns it on
+live_stats = LiveStats()
+
 # ========================
 # Utils
 # ========================
 def clear_screen():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    game_output.clear()
 
 def clamp(v, lo, hi):
     return max(lo, min(hi, v))
 
+def reflect(v, lo, hi):
+    """Fold v back into [lo, hi] as if it bounced off the ends"""
+    if hi <= lo:
+        return lo
+    span = hi - lo
+    offset = (v - lo) % (2 * span)
+    return lo + (offset if offset <= span else 2 * span - offset)
+
 def create_empty_lines():
     for _ in range(2):
-        print("")
+        game_output.write("")
 
 def flush_input():
-    """Clear any pending keyboard input from buffer"""
-    if os.name == 'nt':  # Windows
-        import msvcrt
-        while msvcrt.kbhit():
-            msvcrt.getch()
-    else:  # Unix/Linux/Mac
-        import termios
-        termios.tcflush(sys.stdin, termios.TCIOFLUSH)
+    game_input.flush()
+
+def ask(prompt=">: "):
+    game_output.prompt(prompt)
+    return game_input.read_line()
+
+# ========================
+# Status effects
+# ========================
+# Effect kinds as data (colour is a Colors attribute name). An applied effect's
+# power is the damage it deals per tick (0 for pure debuffs); damage_mult scales
+# the carrier's outgoing attacks. stacking "refresh" replaces an existing effect
+# of the same kind, "stack" adds another independent copy.
+STATUS_EFFECTS = {
+    "wither":   {"label": "WITHERING", "icon": "💀", "color": "DARK",    "damage_mult": 1.0, "stacking": "refresh", "interval": 1},
+    "burn":     {"label": "BURNING",   "icon": "🔥", "color": "WARNING", "damage_mult": 1.0, "stacking": "refresh", "interval": 1},
+    "weakness": {"label": "WEAKNESS",  "icon": "⚠️ ", "color": "DARK",    "damage_mult": 0.5, "stacking": "refresh", "interval": 1},
+}
+EFFECT_ORDER = {name: i for i, name in enumerate(STATUS_EFFECTS)}  # tick order within a turn
+
+class StatusEffect:
+    def __init__(self, name, power, turns):
+        self.name = name
+        self.kind = STATUS_EFFECTS[name]
+        self.power = int(power)
+        self.turns = int(turns)
+        self.expired = False
+
+    def describe(self):
+        if self.power > 0:
+            return f"{self.power} dmg/turn"
+        return f"-{round((1 - self.kind['damage_mult']) * 100)}% damage"
+
+class EffectScheduler:
+    """Ticks timed effects from per-entity queues; only entities with live effects are visited"""
+    def __init__(self):
+        self.clocks = {}  # entity -> turns ticked while it had effects
+        self.queues = {}  # entity -> heap of (due, order, seq, effect)
+        self.seq = 0
+
+    def _schedule(self, entity, effect):
+        self.seq += 1
+        due = self.clocks.get(entity, 0) + effect.kind["interval"]
+        heapq.heappush(self.queues.setdefault(entity, []),
+                       (due, EFFECT_ORDER[effect.name], self.seq, effect))
+
+    def apply(self, entity, name, power=0, turns=1):
+        """Put an effect on any Character"""
+        effect = StatusEffect(name, power, turns)
+        if effect.kind["stacking"] == "refresh":
+            entity.clear_effects(name)
+        entity.effects.append(effect)
+        self._schedule(entity, effect)
+        event_log.emit("status", getattr(entity, "enemy_type", "player"), name, effect.power, effect.turns)
+        return effect
+
+    def restore(self, entity, effects):
+        """Replace an entity's effects with (name, power, turns) triples, without logging procs"""
+        entity.clear_effects()
+        for name, power, turns in effects:
+            effect = StatusEffect(name, power, turns)
+            entity.effects.append(effect)
+            self._schedule(entity, effect)
+
+    def tick(self, entity=None):
+        """Advance one turn for every entity, or just the given one; return [(entity, effect)] that fired"""
+        fired = []
+        for carrier in (list(self.queues) if entity is None else [entity]):
+            queue = self.queues.get(carrier)
+            if queue is None:
+                continue
+            clock = self.clocks[carrier] = self.clocks.get(carrier, 0) + 1
+            while queue and queue[0][0] <= clock:
+                effect = heapq.heappop(queue)[3]
+                if effect.expired:
+                    continue  # cleared or refreshed since it was queued
+                carrier.health -= effect.power
+                effect.turns -= 1
+                fired.append((carrier, effect))
+                if effect.turns > 0:
+                    self._schedule(carrier, effect)
+                else:
+                    effect.expired = True
+                    carrier.effects.remove(effect)
+            if not queue:
+                del self.queues[carrier]
+                del self.clocks[carrier]
+        return fired
+
+    def forget(self, entity):
+        """Drop an entity that will never tick again, effects and all"""
+        entity.clear_effects()
+        self.queues.pop(entity, None)
+        self.clocks.pop(entity, None)
+
+effect_scheduler = EffectScheduler()
+
+def effect_status_lines(character, compact=False):
+    """Coloured one-line summaries of a character's active effects"""
+    lines = []
+    for effect in sorted(character.effects, key=lambda e: EFFECT_ORDER[e.name]):
+        kind = effect.kind
+        if compact:
+            text = f"{kind['icon']} {kind['label'].title()}: {effect.describe()} ({effect.turns} turns)"
+        else:
+            text = f"{kind['icon']} {kind['label']}: {effect.describe()} for {effect.turns} turns"
+        lines.append(getattr(Colors, kind["color"]) + text + Colors.ENDC)
+    return lines
 
 # ========================
 # Entities
@@ -58,6 +640,23 @@ class Character:
         self.max_health = int(health)
         self.health = int(health)
         self.attack = list(attack)
+        self.effects = []  # active StatusEffect instances
+
+    def has_effect(self, name):
+        return any(effect.name == name for effect in self.effects)
+
+    def clear_effects(self, *names):
+        """Remove effects by name (all of them if no names given)"""
+        for effect in list(self.effects):
+            if not names or effect.name in names:
+                effect.expired = True
+                self.effects.remove(effect)
+
+    def damage_multiplier(self):
+        mult = 1.0
+        for effect in self.effects:
+            mult *= effect.kind["damage_mult"]
+        return mult
 
 class Player(Character):
     def __init__(self, x, y, health, attack, weapon, level, xp, gold):
@@ -66,11 +665,6 @@ class Player(Character):
         self.level = int(level)
         self.xp = int(xp)
         self.gold = int(gold)
-        self.burn_damage = 0
-        self.burn_turns = 0
-        self.wither_damage = 0
-        self.wither_turns = 0
-        self.weakness_turns = 0
         self.armor = 0
         self.health_potions = 0
         self.big_potions = 0
@@ -92,28 +686,18 @@ class Player(Character):
             old_health = self.health
             self.health = self.max_health
             self.attack = [dmg + 7 for dmg in self.attack]  # Increased from +5 to +7
-            return True
-        return False
-    
-    def apply_burn(self):
-        """Apply burn damage if burning"""
-        if self.burn_turns > 0:
-            self.health -= self.burn_damage
-            self.burn_turns -= 1
-            return True
-        return False
-    
-    def apply_wither(self):
-        """Apply wither damage if withering"""
-        if self.wither_turns > 0:
-            self.health -= self.wither_damage
-            self.wither_turns -= 1
-            if self.wither_turns == 0:
-                self.weakness_turns = 0  # Remove weakness when wither ends
+            event_log.emit("level_up", self.level, self.max_health)
             return True
         return False
 
 class Enemy(Character):
+    changed = None  # enemies written to since the last world snapshot, once history is on
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if Enemy.changed is not None:
+            Enemy.changed.add(self)
+
     def __init__(self, x, y, health, attack, enemy_type="normal"):
         super().__init__(x, y, health, attack)
         self.searched = False
@@ -122,6 +706,7 @@ class Enemy(Character):
         self.enemy_type = enemy_type  # "normal", "agile", "fire", "darkness"
         self.loot_given = False  # Track if base loot was given on death
         self.attack_counter = 0  # For darkness special attack tracking
+        self.last_update = 0  # World tick this enemy was last simulated (shared world LOD)
     
     def reset_health(self):
         """Reset enemy to full health for new encounter"""
@@ -157,112 +742,123 @@ class Shop:
 # ========================
 def print_alien_art(enemy_type="normal"):
     if enemy_type == "agile":
-        print(Colors.OKCYAN + "       _________")
-        print("      /___   ___\\")
-        print("     //@@@\\ /@@@\\")
-        print("     \\@@@/ \\@@@//")
-        print("      \\___  ___/")
-        print("         |~~~|    (AGILE)")
-        print("          \\_/" + Colors.ENDC)
+        game_output.write(Colors.OKCYAN + "       _________")
+        game_output.write("      /___   ___\\")
+        game_output.write("     //@@@\\ /@@@\\")
+        game_output.write("     \\@@@/ \\@@@//")
+        game_output.write("      \\___  ___/")
+        game_output.write("         |~~~|    (AGILE)")
+        game_output.write("          \\_/" + Colors.ENDC)
     elif enemy_type == "fire":
-        print(Colors.WARNING + "       _________")
-        print("      /___   ___\\")
-        print("     //@@@\\ /@@@\\")
-        print("     \\@@@/ \\@@@//")
-        print("      \\___  ___/")
-        print("    ~~~~~| - |~~~~~  (FIRE)")
-        print("          \\_/" + Colors.ENDC)
+        game_output.write(Colors.WARNING + "       _________")
+        game_output.write("      /___   ___\\")
+        game_output.write("     //@@@\\ /@@@\\")
+        game_output.write("     \\@@@/ \\@@@//")
+        game_output.write("      \\___  ___/")
+        game_output.write("    ~~~~~| - |~~~~~  (FIRE)")
+        game_output.write("          \\_/" + Colors.ENDC)
     elif enemy_type == "darkness":
-        print(Colors.DARK + "                                               ")
-        print("             XMENXM    EN              X    MENXM")
-        print("          ENXMENXM    EN               XM    ENXMENXM")
-        print("        XMENXMENX    XME               NXM    ENXMENXME")
-        print("     NXMENXMENXME    NXME             NXME    NXMENXMENXME")
-        print("    NEXMENXMENXME    NXMENXMENXMENXMENXMEN     XMENXMENXMENX")
-        print("  MENXMENXMENXMEN     XMENXMENXMENXMENXME     NXMENXMENXMENXM")
-        print(" ENXMENXMENXMENXME      NXMENXMENXMENX      MENXMENXMENXMENXM")
-        print(" ENXMENXMENXMENXMEN      XMENXMENXMEN      XMENXMENXMENXMENXM")
-        print("ENXMENXMENXMENXMENXM      ENXMENXMENX     MENXMENXMENXMENXMENX")
-        print("                                                  (DARKNESS)" + Colors.ENDC)
+        game_output.write(Colors.DARK + "                                               ")
+        game_output.write("             XMENXM    EN              X    MENXM")
+        game_output.write("          ENXMENXM    EN               XM    ENXMENXM")
+        game_output.write("        XMENXMENX    XME               NXM    ENXMENXME")
+        game_output.write("     NXMENXMENXME    NXME             NXME    NXMENXMENXME")
+        game_output.write("    NEXMENXMENXME    NXMENXMENXMENXMENXMEN     XMENXMENXMENX")
+        game_output.write("  MENXMENXMENXMEN     XMENXMENXMENXMENXME     NXMENXMENXMENXM")
+        game_output.write(" ENXMENXMENXMENXME      NXMENXMENXMENX      MENXMENXMENXMENXM")
+        game_output.write(" ENXMENXMENXMENXMEN      XMENXMENXMEN      XMENXMENXMENXMENXM")
+        game_output.write("ENXMENXMENXMENXMENXM      ENXMENXMENX     MENXMENXMENXMENXMENX")
+        game_output.write("                                                  (DARKNESS)" + Colors.ENDC)
     else:
-        print("       _________")
-        print("      /___   ___\\")
-        print("     //@@@\\ /@@@\\")
-        print("     \\@@@/ \\@@@//")
-        print("      \\___  ___/")
-        print("         | - |")
-        print("          \\_/" + Colors.ENDC)
+        game_output.write("       _________")
+        game_output.write("      /___   ___\\")
+        game_output.write("     //@@@\\ /@@@\\")
+        game_output.write("     \\@@@/ \\@@@//")
+        game_output.write("      \\___  ___/")
+        game_output.write("         | - |")
+        game_output.write("          \\_/" + Colors.ENDC)
 
 def print_shop_art():
-    print(Colors.WARNING + "                ______________")
-    print("    __,.,---'''''              '''''---..._")
-    print(" ,-'             .....:::''::.:            '`-.")
-    print("'           ...:::.....       '")
-    print("            ''':::'''''       . ")
-    print("            ''':::'''''       .               ,")
-    print("|'-.._           ''''':::..::':          __,,-")
-    print(" '-.._''`---.....______________.....---''__,,-")
-    print("      ''`---.....______________.....---''" + Colors.ENDC)
+    game_output.write(Colors.WARNING + "                ______________")
+    game_output.write("    __,.,---'''''              '''''---..._")
+    game_output.write(" ,-'             .....:::''::.:            '`-.")
+    game_output.write("'           ...:::.....       '")
+    game_output.write("            ''':::'''''       . ")
+    game_output.write("            ''':::'''''       .               ,")
+    game_output.write("|'-.._           ''''':::..::':          __,,-")
+    game_output.write(" '-.._''`---.....______________.....---''__,,-")
+    game_output.write("      ''`---.....______________.....---''" + Colors.ENDC)
 
 def title_screen():
-    print(Colors.OKCYAN + "__  __    __  __   ____   __  _ " + Colors.ENDC)
-    print(Colors.OKCYAN + r"\ \/ /   |  \/  | / () \ |  \| |" + Colors.ENDC)
-    print(Colors.OKCYAN + r"/_/\_\   |_|\/|_|/__/\__\|_|\__|" + Colors.ENDC)
-    print(Colors.OKCYAN + "             X-Man" + Colors.ENDC)
+    game_output.write(Colors.OKCYAN + "__  __    __  __   ____   __  _ " + Colors.ENDC)
+    game_output.write(Colors.OKCYAN + r"\ \/ /   |  \/  | / () \ |  \| |" + Colors.ENDC)
+    game_output.write(Colors.OKCYAN + r"/_/\_\   |_|\/|_|/__/\__\|_|\__|" + Colors.ENDC)
+    game_output.write(Colors.OKCYAN + "             X-Man" + Colors.ENDC)
 
 # ========================
 # UI helpers
 # ========================
 def show_stats():
-    print("===============")
-    print(Colors.OKGREEN + f"Health: {Player_1.health}/{Player_1.max_health}" + Colors.ENDC)
-    if Player_1.burn_turns > 0:
-        print(Colors.WARNING + f"🔥 BURNING: {Player_1.burn_damage} dmg/turn for {Player_1.burn_turns} turns" + Colors.ENDC)
-    if Player_1.wither_turns > 0:
-        print(Colors.DARK + f"💀 WITHERING: {Player_1.wither_damage} dmg/turn for {Player_1.wither_turns} turns" + Colors.ENDC)
-    if Player_1.weakness_turns > 0:
-        print(Colors.DARK + f"⚠️  WEAKNESS: -50% damage for {Player_1.weakness_turns} turns" + Colors.ENDC)
-    print("Weapon: " + Player_1.weapon)
+    game_output.write("===============")
+    game_output.write(Colors.OKGREEN + f"Health: {Player_1.health}/{Player_1.max_health}" + Colors.ENDC)
+    for line in effect_status_lines(Player_1):
+        game_output.write(line)
+    game_output.write("Weapon: " + Player_1.weapon)
     if Player_1.armor > 0:
-        print(Colors.OKBLUE + f"Armor: {Player_1.armor} (reduces damage)" + Colors.ENDC)
-    print(Colors.OKBLUE + "Level: " + Colors.ENDC + str(Player_1.level))
-    print(f"XP: {Player_1.xp}/{Player_1.level * 100}")
-    print(Colors.WARNING + "Gold: " + Colors.ENDC + str(Player_1.gold))
-    print(Colors.HEADER + f"Potions: {Player_1.health_potions} | Big Potions: {Player_1.big_potions}" + Colors.ENDC)
-    print("===============")
+        game_output.write(Colors.OKBLUE + f"Armor: {Player_1.armor} (reduces damage)" + Colors.ENDC)
+    game_output.write(Colors.OKBLUE + "Level: " + Colors.ENDC + str(Player_1.level))
+    game_output.write(f"XP: {Player_1.xp}/{Player_1.level * 100}")
+    game_output.write(Colors.WARNING + "Gold: " + Colors.ENDC + str(Player_1.gold))
+    game_output.write(Colors.HEADER + f"Potions: {Player_1.health_potions} | Big Potions: {Player_1.big_potions}" + Colors.ENDC)
+    game_output.write("===============")
+
+def board_glyph(kind):
+    """(char, colour) a board cell shows for 'shop', 'you', 'player' or an enemy type"""
+    if kind == "shop":
+        return ('S', Colors.OKGREEN)
+    if kind == "you":
+        return ('X', Colors.OKCYAN)
+    if kind == "player":
+        return ('P', Colors.OKBLUE)
+    if kind == "agile":
+        return ('^', Colors.OKCYAN)
+    if kind == "fire":
+        return ('O', Colors.WARNING)
+    if kind == "darkness":
+        return (' ', "")  # Blank space - invisible!
+    return ('E', Colors.FAIL)
 
 def generate_board():
     width  = BOARD_WIDTH
     height = BOARD_HEIGHT
 
+    rows = []
     for y in range(height):
-        row = ['-' for _ in range(width)]
+        row = [('-', "") for _ in range(width)]
 
         # place shops on this row
         for shop in shop_list:
             if 0 <= shop.x < width and 0 <= shop.y < height and shop.y == y:
-                row[shop.x] = Colors.OKGREEN + 'S' + Colors.ENDC
+                row[shop.x] = board_glyph("shop")
 
         # place enemies on this row (only if alive)
         for enemy in enemy_list:
             if not enemy.is_dead and 0 <= enemy.x < width and 0 <= enemy.y < height and enemy.y == y:
-                if enemy.enemy_type == "agile":
-                    row[enemy.x] = Colors.OKCYAN + '^' + Colors.ENDC
-                elif enemy.enemy_type == "fire":
-                    row[enemy.x] = Colors.WARNING + 'O' + Colors.ENDC
-                elif enemy.enemy_type == "darkness":
-                    row[enemy.x] = ' '  # Blank space - invisible!
-                else:
-                    row[enemy.x] = Colors.FAIL + 'E' + Colors.ENDC
+                row[enemy.x] = board_glyph(enemy.enemy_type)
 
         # place player on this row (draw last to sit "on top")
         if 0 <= Player_1.x < width and 0 <= Player_1.y < height and Player_1.y == y:
-            row[Player_1.x] = Colors.OKCYAN + 'X' + Colors.ENDC
+            row[Player_1.x] = board_glyph("you")
 
-        print(''.join(row))
+        rows.append(row)
+
+    # one write per frame, colour codes only where the colour changes
+    game_output.write(board_encoder.encode(rows), end="")
 
     create_empty_lines()
     show_stats()
+    if show_frame_stats:
+        game_output.write(Colors.DARK + board_encoder.report() + Colors.ENDC)
 
 def encounter_check():
     for enemy in enemy_list:
@@ -294,217 +890,274 @@ def respawn_enemies():
                 enemy.y = random.randint(3, BOARD_HEIGHT - 1)
                 enemy.reset_health()
 
+# ========================
+# Combat rules
+# ========================
+def effect_tick_line(entity, effect):
+    kind = effect.kind
+    who = "You take" if isinstance(entity, Player) else "The enemy takes"
+    return getattr(Colors, kind["color"]) + f"{kind['icon']} {who} {effect.power} {effect.name} damage! ({effect.turns} turns left)" + Colors.ENDC
+
+def damage_modifier_line(character, whose):
+    """Note naming the effects that scale a character's attacks, or None if none do"""
+    modifiers = [effect for effect in character.effects if effect.kind["damage_mult"] != 1.0]
+    if not modifiers:
+        return None
+    mult = character.damage_multiplier()
+    change = "halved" if mult == 0.5 else f"{'cut' if mult < 1 else 'raised'} to {mult:.0%}"
+    labels = " + ".join(effect.kind["label"] for effect in modifiers)
+    return getattr(Colors, modifiers[0].kind["color"]) + f"({whose} damage is {change} by {labels}!)" + Colors.ENDC
+
+def scaled_damage(attacker, damage, whose, lines):
+    """Apply the attacker's effect multiplier to one hit, noting it in lines"""
+    note = damage_modifier_line(attacker, whose)
+    if note is None:
+        return damage
+    lines.append(note)
+    return int(damage * attacker.damage_multiplier())
+
+def player_strike(player, enemy):
+    """Player attacks the enemy; returns (hit, lines to show)"""
+    # Check if attack misses (agile or darkness enemies)
+    miss_chance = 0
+    if enemy.enemy_type == "agile":
+        miss_chance = 0.35
+    elif enemy.enemy_type == "darkness":
+        miss_chance = 0.05
+
+    if miss_chance > 0 and random.random() < miss_chance:
+        if enemy.enemy_type == "darkness":
+            return False, [Colors.DARK + "Your attack passes through the darkness!" + Colors.ENDC]
+        return False, [Colors.OKCYAN + "The agile alien dodged your attack!" + Colors.ENDC]
+
+    lines = []
+    attack_value = random.randint(0, len(player.attack) - 1)
+    damage = scaled_damage(player, player.attack[attack_value], "Your", lines)
+
+    enemy.health -= damage
+    if attack_value == len(player.attack) - 1:
+        lines.append(Colors.OKGREEN + "Critical hit on the enemy!" + Colors.ENDC)
+    lines.append(f"(*) You did {damage} damage!")
+    return True, lines
+
+def enemy_strike(enemy, player):
+    """Enemy attacks the player (armor, crits, wither and burn procs); returns lines to show"""
+    lines = []
+    attack_value = random.randint(0, len(enemy.attack) - 1)
+    if attack_value == len(enemy.attack) - 1:
+        lines.append(Colors.FAIL + "Critical hit on you!" + Colors.ENDC)
+
+    base_damage = scaled_damage(enemy, enemy.attack[attack_value], "The enemy's", lines)
+    # Apply armor reduction
+    actual_damage = max(1, base_damage - (player.armor * 2))
+    player.health -= actual_damage
+
+    if player.armor > 0:
+        lines.append(f"-[*]- The enemy did {base_damage} damage ({actual_damage} after armor)!")
+    else:
+        lines.append(f"-[*]- The enemy did {actual_damage} damage to you!")
+
+    # Darkness special attack (every 4th attack)
+    if enemy.enemy_type == "darkness":
+        enemy.attack_counter += 1
+        if enemy.attack_counter % 4 == 0:
+            effect_scheduler.apply(player, "wither", 8, 2)
+            effect_scheduler.apply(player, "weakness", 0, 2)
+            lines.append(Colors.DARK + "💀 The darkness withers you! 8 damage/turn for 2 turns + WEAKNESS!" + Colors.ENDC)
+
+    # Fire enemy applies burn
+    if enemy.enemy_type == "fire" and random.random() < 0.5:
+        burn_dmg = random.randint(3, 7)
+        burn_duration = random.randint(2, 4)
+        effect_scheduler.apply(player, "burn", burn_dmg, burn_duration)
+        lines.append(Colors.WARNING + f"🔥 You've been set on fire! {burn_dmg} damage per turn for {burn_duration} turns!" + Colors.ENDC)
+    return lines
+
+def grant_kill_rewards(player, enemy):
+    """Mark the enemy dead and pay out; returns (xp, gold, leveled_up)"""
+    enemy.is_dead = True
+    effect_scheduler.forget(enemy)  # a corpse takes no more ticks
+
+    xp_reward = drop_tables.sample((enemy.enemy_type, "xp"))
+    gold_reward = drop_tables.sample((enemy.enemy_type, "gold"))
+
+    # Mark that base loot was given on death
+    enemy.loot_given = True
+
+    # Apply rewards to player
+    player.gold += gold_reward
+    player.total_gold += gold_reward
+    player.enemies_killed += 1
+    event_log.emit("kill", enemy.enemy_type, player.level)
+    event_log.emit("loot", "kill", enemy.enemy_type, gold_reward, xp_reward)
+
+    leveled_up = player.gain_xp(xp_reward)
+    return xp_reward, gold_reward, leveled_up
+
+def wander_enemy(enemy, axis, limit):
+    """Random-walk one step along 'x' or 'y', pushed back in from the edges"""
+    pos = getattr(enemy, axis)
+    if 1 < pos < limit - 2:
+        pos += random.randint(-1, 1)
+    elif pos <= 1:
+        pos += 1
+    elif pos >= limit - 2:
+        pos -= 1
+    setattr(enemy, axis, clamp(pos, 0, limit - 1))
+
+# ========================
+# Commands
+# ========================
+# What a command handler returns: carry on, stop repeating this command
+# (e.g. out of gold on "buy potion x10"), or leave the scene
+KEEP = None
+STOP = "stop"
+LEAVE = "leave"
+
+MAX_REPEAT = 99
+
+def resolve_name(word, names):
+    """Exact name, else the only name starting with word; None if unknown or ambiguous"""
+    if word in names:
+        return word
+    matches = [name for name in names if name.startswith(word)]
+    return matches[0] if len(matches) == 1 else None
+
+class CommandRegistry:
+    """Commands for one scene; any unique prefix works as an abbreviation"""
+    def __init__(self):
+        self.handlers = {}
+
+    def command(self, name):
+        """Decorator registering handler(arg, *context) under name"""
+        def register(handler):
+            self.handlers[name] = handler
+            return handler
+        return register
+
+    def resolve(self, word):
+        name = resolve_name(word, list(self.handlers))
+        return self.handlers[name] if name else None
+
+def parse_commands(line):
+    """'buy potion x10; equip axe' -> [('buy', 'potion', 10), ('equip', 'axe', 1)]"""
+    batch = []
+    for part in line.lower().split(";"):
+        words = part.split()
+        if not words:
+            continue
+        count = 1
+        if len(words) > 1 and words[-1][:1] == "x" and words[-1][1:].isdigit():
+            count = clamp(int(words.pop()[1:]), 1, MAX_REPEAT)
+        batch.append((words[0], " ".join(words[1:]), count))
+    return batch
+
+def run_batch(registry, line, *context):
+    """Run every command on the line in order; returns LEAVE if one of them ended the scene.
+
+    An unknown or ambiguous command stops the rest of the line so a typo
+    never lets later commands run out of context.
+    """
+    for word, arg, count in parse_commands(line):
+        handler = registry.resolve(word)
+        if handler is None:
+            game_output.write(f"Unknown Command '{word}', type 'help' for help!")
+            return KEEP
+        for _ in range(count):
+            result = handler(arg, *context)
+            if result == LEAVE:
+                return LEAVE
+            if result == STOP:
+                break
+    return KEEP
+
 # ========================
 # Encounters
 # ========================
-def enemy_prompt(exact_enemy):
-    if exact_enemy.health <= 0:
-        death_encounter(exact_enemy)
-        return
+combat_commands = CommandRegistry()
 
-    answer = input(">: ").lower().strip()
-    if answer == "help":
-        create_empty_lines()
-        print("Attack | Run | Potion | BigPotion")
-        time.sleep(2.5)
-        enemy_encounter(exact_enemy)
-    
-    elif answer == "potion":
-        if Player_1.health_potions <= 0:
-            create_empty_lines()
-            print("You don't have any health potions!")
-            time.sleep(1.0)
-            enemy_encounter(exact_enemy)
-        else:
-            Player_1.health_potions -= 1
-            heal_amount = random.randint(30, 50)
-            Player_1.health = min(Player_1.max_health, Player_1.health + heal_amount)
-            create_empty_lines()
-            print(Colors.OKGREEN + f"You drank a potion and restored {heal_amount} HP!" + Colors.ENDC)
-            print(f"Current Health: {Player_1.health}/{Player_1.max_health}")
-            print(Colors.HEADER + f"Potions remaining: {Player_1.health_potions}" + Colors.ENDC)
-            time.sleep(1.5)
-            # Potion doesn't consume a turn, return to combat
-            enemy_encounter(exact_enemy)
-    
-    elif answer == "bigpotion":
-        if Player_1.big_potions <= 0:
-            create_empty_lines()
-            print("You don't have any big potions!")
-            time.sleep(1.0)
-            enemy_encounter(exact_enemy)
-        else:
-            Player_1.big_potions -= 1
-            heal_amount = random.randint(50, 100)
-            Player_1.health = min(Player_1.max_health, Player_1.health + heal_amount)
-            create_empty_lines()
-            print(Colors.OKGREEN + f"You drank a BIG POTION and restored {heal_amount} HP!" + Colors.ENDC)
-            print(f"Current Health: {Player_1.health}/{Player_1.max_health}")
-            print(Colors.HEADER + f"Big Potions remaining: {Player_1.big_potions}" + Colors.ENDC)
-            time.sleep(1.5)
-            # Potion doesn't consume a turn, return to combat
-            enemy_encounter(exact_enemy)
-
-    elif answer == "attack" and exact_enemy.health > 0:
-        # Apply status effects to player first
-        wither_damage_taken = False
-        if Player_1.apply_wither():
-            create_empty_lines()
-            print(Colors.DARK + f"💀 You take {Player_1.wither_damage} wither damage! ({Player_1.wither_turns} turns left)" + Colors.ENDC)
-            wither_damage_taken = True
-            time.sleep(1.0)
-            if Player_1.health <= 0:
-                game_over()
-                return
-        
-        if Player_1.apply_burn():
-            if wither_damage_taken:
-                print("")
-            else:
-                create_empty_lines()
-            print(Colors.WARNING + f"🔥 You take {Player_1.burn_damage} burn damage! ({Player_1.burn_turns} turns left)" + Colors.ENDC)
-            time.sleep(1.0)
-            if Player_1.health <= 0:
-                game_over()
-                return
-        
-        # Check if attack misses (agile or darkness enemies)
-        miss_chance = 0
-        if exact_enemy.enemy_type == "agile":
-            miss_chance = 0.35
-        elif exact_enemy.enemy_type == "darkness":
-            miss_chance = 0.05
-        
-        if miss_chance > 0 and random.random() < miss_chance:
-            create_empty_lines()
-            if exact_enemy.enemy_type == "darkness":
-                print(Colors.DARK + "Your attack passes through the darkness!" + Colors.ENDC)
-            else:
-                print(Colors.OKCYAN + "The agile alien dodged your attack!" + Colors.ENDC)
-            print("")
-            # Enemy still attacks back
-            enemy_attack_value = random.randint(0, len(exact_enemy.attack) - 1)
-            if enemy_attack_value == len(exact_enemy.attack) - 1:
-                print(Colors.FAIL + "Critical hit on you!" + Colors.ENDC)
-            base_damage = exact_enemy.attack[enemy_attack_value]
-            actual_damage = max(1, base_damage - (Player_1.armor * 2))
-            Player_1.health -= actual_damage
-            
-            if Player_1.armor > 0:
-                print(f"-[*]- The enemy did {base_damage} damage ({actual_damage} after armor)!")
-            else:
-                print(f"-[*]- The enemy did {actual_damage} damage to you!")
-            
-            # Darkness special attack check
-            if exact_enemy.enemy_type == "darkness":
-                exact_enemy.attack_counter += 1
-                if exact_enemy.attack_counter % 4 == 0:
-                    Player_1.wither_damage = 8
-                    Player_1.wither_turns = 2
-                    Player_1.weakness_turns = 2
-                    print(Colors.DARK + "💀 The darkness withers you! 8 damage/turn for 2 turns + WEAKNESS!" + Colors.ENDC)
-            
-            # Fire enemy applies burn
-            if exact_enemy.enemy_type == "fire" and random.random() < 0.5:
-                burn_dmg = random.randint(3, 7)
-                burn_duration = random.randint(2, 4)
-                Player_1.burn_damage = burn_dmg
-                Player_1.burn_turns = burn_duration
-                print(Colors.WARNING + f"🔥 You've been set on fire! {burn_dmg} damage per turn for {burn_duration} turns!" + Colors.ENDC)
-            
-            if Player_1.health <= 0:
-                game_over()
-                return
-            time.sleep(1.5)
-            enemy_encounter(exact_enemy)
-            return
-        
-        # Normal attack
-        player_attack_value = random.randint(0, len(Player_1.attack) - 1)
-        enemy_attack_value = random.randint(0, len(exact_enemy.attack) - 1)
-        create_empty_lines()
-        print("You attack the enemy...")
-        create_empty_lines()
-        
-        # Calculate damage (reduced by weakness)
-        damage = Player_1.attack[player_attack_value]
-        if Player_1.weakness_turns > 0:
-            damage = int(damage * 0.5)
-            print(Colors.DARK + "(Your damage is halved by WEAKNESS!)" + Colors.ENDC)
-        
-        exact_enemy.health -= damage
-        if player_attack_value == len(Player_1.attack) - 1:
-            print(Colors.OKGREEN + "Critical hit on the enemy!" + Colors.ENDC)
-        print(f"(*) You did {damage} damage!")
-        print("")
-        
-        # Check if player killed enemy
-        if exact_enemy.health <= 0:
-            enemy_encounter(exact_enemy)
-            return
-        
-        # Enemy attacks back
-        if enemy_attack_value == len(exact_enemy.attack) - 1:
-            print(Colors.FAIL + "Critical hit on you!" + Colors.ENDC)
-        
-        base_damage = exact_enemy.attack[enemy_attack_value]
-        # Apply armor reduction
-        actual_damage = max(1, base_damage - (Player_1.armor * 2))
-        Player_1.health -= actual_damage
-        
-        if Player_1.armor > 0:
-            print(f"-[*]- The enemy did {base_damage} damage ({actual_damage} after armor)!")
-        else:
-            print(f"-[*]- The enemy did {actual_damage} damage to you!")
-        
-        # Darkness special attack (every 4th attack)
-        if exact_enemy.enemy_type == "darkness":
-            exact_enemy.attack_counter += 1
-            if exact_enemy.attack_counter % 4 == 0:
-                Player_1.wither_damage = 8
-                Player_1.wither_turns = 2
-                Player_1.weakness_turns = 2
-                print(Colors.DARK + "💀 The darkness withers you! 8 damage/turn for 2 turns + WEAKNESS!" + Colors.ENDC)
-        
-        # Fire enemy applies burn
-        if exact_enemy.enemy_type == "fire" and random.random() < 0.5:
-            burn_dmg = random.randint(3, 7)
-            burn_duration = random.randint(2, 4)
-            Player_1.burn_damage = burn_dmg
-            Player_1.burn_turns = burn_duration
-            print(Colors.WARNING + f"🔥 You've been set on fire! {burn_dmg} damage per turn for {burn_duration} turns!" + Colors.ENDC)
-        
-        # Check if player died
-        if Player_1.health <= 0:
-            game_over()
-            return
-            
-        time.sleep(1.5)
-        enemy_encounter(exact_enemy)
-
-    elif answer == "run" and exact_enemy.health > 0:
-        decision = random.randint(0, 1)
-        if decision == 0:
-            create_empty_lines()
-            print("The enemy has caught you...")
-            time.sleep(1.0)
-            enemy_encounter(exact_enemy)
-        else:
-            create_empty_lines()
-            print("Got away safe and sound...")
-            create_empty_lines()
-            print(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
+@combat_commands.command("help")
+def combat_help(arg, exact_enemy):
+    game_output.write("Attack | Run | Potion | BigPotion")
+    game_output.write("Chain commands with ';' and repeat with xN, e.g. potion; attack x3")
+
+def drink_potion(big):
+    if big:
+        stock, name, heal_amount = "big_potions", "BIG POTION", random.randint(50, 100)
     else:
-        create_empty_lines()
-        print("Unknown Command, type 'help' for help!")
-        time.sleep(0.7)
-        enemy_encounter(exact_enemy)
+        stock, name, heal_amount = "health_potions", "potion", random.randint(30, 50)
+    if getattr(Player_1, stock) <= 0:
+        game_output.write(f"You don't have any {'big' if big else 'health'} potions!")
+        return STOP
+    setattr(Player_1, stock, getattr(Player_1, stock) - 1)
+    Player_1.health = min(Player_1.max_health, Player_1.health + heal_amount)
+    game_output.write(Colors.OKGREEN + f"You drank a {name} and restored {heal_amount} HP!" + Colors.ENDC)
+    game_output.write(f"Current Health: {Player_1.health}/{Player_1.max_health}")
+    remaining = "Big Potions" if big else "Potions"
+    game_output.write(Colors.HEADER + f"{remaining} remaining: {getattr(Player_1, stock)}" + Colors.ENDC)
+    # Potion doesn't consume a turn
+    return KEEP
 
-def enemy_encounter(exact_enemy):
-    clear_screen()
-    print_alien_art(exact_enemy.enemy_type)
+@combat_commands.command("potion")
+def combat_potion(arg, exact_enemy):
+    return drink_potion(big=False)
+
+@combat_commands.command("bigpotion")
+def combat_bigpotion(arg, exact_enemy):
+    return drink_potion(big=True)
+
+@combat_commands.command("attack")
+def combat_attack(arg, exact_enemy):
+    # Tick both fighters' status effects first
+    for entity, effect in effect_scheduler.tick(Player_1) + effect_scheduler.tick(exact_enemy):
+        if effect.power > 0:
+            game_output.write(effect_tick_line(entity, effect))
+    if Player_1.health <= 0:
+        game_over()
+    if exact_enemy.health <= 0:
+        return LEAVE  # the encounter loop sees the kill
+
+    hit, lines = player_strike(Player_1, exact_enemy)
+    if hit:
+        game_output.write("You attack the enemy...")
+    for line in lines:
+        game_output.write(line)
+
+    # Check if player killed enemy
+    if exact_enemy.health <= 0:
+        return LEAVE
+
+    # Enemy attacks back (even when our attack missed)
+    for line in enemy_strike(exact_enemy, Player_1):
+        game_output.write(line)
+    game_output.write("")
+
+    # Check if player died
+    if Player_1.health <= 0:
+        game_over()
+
+@combat_commands.command("run")
+def combat_run(arg, exact_enemy):
+    if random.randint(0, 1) == 0:
+        game_output.write("The enemy has caught you...")
+        return KEEP
+    game_output.write("Got away safe and sound...")
+    create_empty_lines()
+    game_output.write(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
+    return LEAVE
+
+def enemy_prompt(exact_enemy):
+    """Read one line of combat commands and run it as a batch"""
+    answer = ask()
     create_empty_lines()
-    if exact_enemy.health > 0:
+    return run_batch(combat_commands, answer, exact_enemy)
+
+def enemy_encounter(exact_enemy):
+    while True:
+        memory_probe.sample("combat")
+        clear_screen()
+        print_alien_art(exact_enemy.enemy_type)
+        create_empty_lines()
         type_name = "ENEMY"
         if exact_enemy.enemy_type == "agile":
             type_name = Colors.OKCYAN + "AGILE ENEMY" + Colors.ENDC + " (Can dodge attacks!)"
@@ -512,317 +1165,1247 @@ def enemy_encounter(exact_enemy):
             type_name = Colors.WARNING + "FIRE ENEMY" + Colors.ENDC + " (Can burn you!)"
         elif exact_enemy.enemy_type == "darkness":
             type_name = Colors.DARK + "DARKNESS ENTITY" + Colors.ENDC + " (Withers and weakens!)"
-        print(f"YOU HAVE ENCOUNTERED {type_name}!")
-    print("")
-    print("===============")
-    print(f"Player Health: {Player_1.health}/{Player_1.max_health}")
-    if Player_1.burn_turns > 0:
-        print(Colors.WARNING + f"🔥 Burning: {Player_1.burn_damage} dmg/turn ({Player_1.burn_turns} turns)" + Colors.ENDC)
-    if Player_1.wither_turns > 0:
-        print(Colors.DARK + f"💀 Withering: {Player_1.wither_damage} dmg/turn ({Player_1.wither_turns} turns)" + Colors.ENDC)
-    if Player_1.weakness_turns > 0:
-        print(Colors.DARK + f"⚠️  Weakness: -50% damage ({Player_1.weakness_turns} turns)" + Colors.ENDC)
-    print(f"Enemy  Health: {max(0, exact_enemy.health)}")
-    if exact_enemy.enemy_type == "darkness" and exact_enemy.attack_counter > 0:
-        turns_until_special = 4 - (exact_enemy.attack_counter % 4)
-        if turns_until_special == 4:
-            turns_until_special = 0
-        if turns_until_special > 0:
-            print(Colors.DARK + f"Next wither attack in: {turns_until_special} turns" + Colors.ENDC)
-    print("===============")
-    create_empty_lines()
-    print("Type 'help' for a list of actions...")
-    create_empty_lines()
-    enemy_prompt(exact_enemy)
-
-def death_prompt(exact_enemy):
-    answer = input(">: ").lower().strip()
-    if answer == "exit":
-        create_empty_lines()
-        print(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
-    elif answer == "help":
+        game_output.write(f"YOU HAVE ENCOUNTERED {type_name}!")
+        game_output.write("")
+        game_output.write("===============")
+        game_output.write(f"Player Health: {Player_1.health}/{Player_1.max_health}")
+        for line in effect_status_lines(Player_1, compact=True):
+            game_output.write(line)
+        game_output.write(f"Enemy  Health: {max(0, exact_enemy.health)}")
+        if exact_enemy.enemy_type == "darkness" and exact_enemy.attack_counter > 0:
+            turns_until_special = 4 - (exact_enemy.attack_counter % 4)
+            if turns_until_special == 4:
+                turns_until_special = 0
+            if turns_until_special > 0:
+                game_output.write(Colors.DARK + f"Next wither attack in: {turns_until_special} turns" + Colors.ENDC)
+        game_output.write("===============")
         create_empty_lines()
-        print("Exit | Tbag | Search")
-        death_prompt(exact_enemy)
-    elif answer == "tbag":
+        game_output.write("Type 'help' for a list of actions...")
         create_empty_lines()
-        if exact_enemy.enemy_type == "darkness":
-            print("You attempt to t-bag the darkness... but there's nothing there...")
-        else:
-            print("You t-bag the alien's dead corpse XD...")
-        death_prompt(exact_enemy)
-    elif answer == "search":
-        if exact_enemy.searched:
-            create_empty_lines()
-            print("You've already searched this corpse!")
-            death_prompt(exact_enemy)
-        else:
-            exact_enemy.searched = True
-            # Give small bonus for searching (since main loot was given on kill)
-            bonus_gold = random.randint(3, 8)
-            
-            # Bonus rewards for special enemies
-            if exact_enemy.enemy_type == "agile":
-                bonus_gold += 2
-            elif exact_enemy.enemy_type == "fire":
-                bonus_gold += 3
-            elif exact_enemy.enemy_type == "darkness":
-                bonus_gold += 5
-            
-            create_empty_lines()
-            print("You search the remains...")
-            print("You found: " + Colors.WARNING + f"{bonus_gold}" + Colors.ENDC + " extra Gold!")
-            Player_1.gold += bonus_gold
-            Player_1.total_gold += bonus_gold
-            
-            print(f"You now have {Player_1.gold} Gold total!")
-            death_prompt(exact_enemy)
+
+        result = enemy_prompt(exact_enemy)
+        if exact_enemy.health <= 0:
+            game_output.pause(1.0)
+            death_encounter(exact_enemy)
+            return
+        if result == LEAVE:
+            return
+        # One pause and redraw per batch, however many commands it held
+        game_output.pause(1.5)
+
+death_commands = CommandRegistry()
+
+@death_commands.command("help")
+def death_help(arg, exact_enemy):
+    game_output.write("Exit | Tbag | Search")
+
+@death_commands.command("exit")
+def death_exit(arg, exact_enemy):
+    create_empty_lines()
+    game_output.write(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
+    return LEAVE
+
+@death_commands.command("tbag")
+def death_tbag(arg, exact_enemy):
+    if exact_enemy.enemy_type == "darkness":
+        game_output.write("You attempt to t-bag the darkness... but there's nothing there...")
     else:
-        create_empty_lines()
-        print("Unknown Command, type 'help' for help!")
-        death_prompt(exact_enemy)
+        game_output.write("You t-bag the alien's dead corpse XD...")
 
-def death_encounter(exact_enemy):
-    exact_enemy.is_dead = True
-
-    # XP reward
-    xp_reward = random.randint(30, 50)
-    if exact_enemy.enemy_type == "agile":
-        xp_reward += 20
-    elif exact_enemy.enemy_type == "fire":
-        xp_reward += 30
-    elif exact_enemy.enemy_type == "darkness":
-        xp_reward += 50
-
-    # Gold reward on kill
-    gold_reward = random.randint(10, 15)
-    if exact_enemy.enemy_type == "agile":
-        gold_reward += 5
-    elif exact_enemy.enemy_type == "fire":
-        gold_reward += 10
-    elif exact_enemy.enemy_type == "darkness":
-        gold_reward += 15
+@death_commands.command("search")
+def death_search(arg, exact_enemy):
+    if exact_enemy.searched:
+        game_output.write("You've already searched this corpse!")
+        return STOP
+    exact_enemy.searched = True
+    # Give small bonus for searching (since main loot was given on kill)
+    bonus_gold = drop_tables.sample((exact_enemy.enemy_type, "search_gold"))
 
-    # Mark that base loot was given on death
-    exact_enemy.loot_given = True
+    game_output.write("You search the remains...")
+    game_output.write("You found: " + Colors.WARNING + f"{bonus_gold}" + Colors.ENDC + " extra Gold!")
+    Player_1.gold += bonus_gold
+    Player_1.total_gold += bonus_gold
+    event_log.emit("loot", "search", exact_enemy.enemy_type, bonus_gold, 0)
 
-    # Apply rewards to player
-    Player_1.gold += gold_reward
-    Player_1.total_gold += gold_reward
-    Player_1.enemies_killed += 1
+    game_output.write(f"You now have {Player_1.gold} Gold total!")
 
-    leveled_up = Player_1.gain_xp(xp_reward)
+def death_prompt(exact_enemy):
+    while True:
+        answer = ask()
+        create_empty_lines()
+        if run_batch(death_commands, answer, exact_enemy) == LEAVE:
+            return
+
+def death_encounter(exact_enemy):
+    memory_probe.sample("death")
+    xp_reward, gold_reward, leveled_up = grant_kill_rewards(Player_1, exact_enemy)
 
     clear_screen()
     print_alien_art(exact_enemy.enemy_type)
     create_empty_lines()
-    print("YOU HAVE KILLED AN ENEMY!")
-    print(Colors.OKBLUE + f"You gained {xp_reward} XP!" + Colors.ENDC)
-    print(Colors.WARNING + f"You found {gold_reward} Gold!" + Colors.ENDC)
+    game_output.write("YOU HAVE KILLED AN ENEMY!")
+    game_output.write(Colors.OKBLUE + f"You gained {xp_reward} XP!" + Colors.ENDC)
+    game_output.write(Colors.WARNING + f"You found {gold_reward} Gold!" + Colors.ENDC)
 
     if leveled_up:
         create_empty_lines()
-        print(Colors.OKGREEN + "★★★ LEVEL UP! ★★★" + Colors.ENDC)
-        print(f"You are now level {Player_1.level}!")
-        print(f"Max Health increased to {Player_1.max_health}!")
-        print("Attack damage increased!")
-        print(Colors.OKGREEN + "Fully healed!" + Colors.ENDC)
-        if Player_1.burn_turns > 0:
-            Player_1.burn_turns = 0
-            print(Colors.OKGREEN + "Burn cured!" + Colors.ENDC)
-        if Player_1.wither_turns > 0:
-            Player_1.wither_turns = 0
-            Player_1.weakness_turns = 0
-            print(Colors.OKGREEN + "Wither and weakness cured!" + Colors.ENDC)
-        time.sleep(2.0)
-
-    print("")
-    print("Type 'help' for a list of actions...")
+        game_output.write(Colors.OKGREEN + "★★★ LEVEL UP! ★★★" + Colors.ENDC)
+        game_output.write(f"You are now level {Player_1.level}!")
+        game_output.write(f"Max Health increased to {Player_1.max_health}!")
+        game_output.write("Attack damage increased!")
+        game_output.write(Colors.OKGREEN + "Fully healed!" + Colors.ENDC)
+        if Player_1.has_effect("burn"):
+            Player_1.clear_effects("burn")
+            game_output.write(Colors.OKGREEN + "Burn cured!" + Colors.ENDC)
+        if Player_1.has_effect("wither"):
+            Player_1.clear_effects("wither", "weakness")
+            game_output.write(Colors.OKGREEN + "Wither and weakness cured!" + Colors.ENDC)
+        game_output.pause(2.0)
+
+    game_output.write("")
+    game_output.write("Type 'help' for a list of actions...")
     create_empty_lines()
     death_prompt(exact_enemy)
 
+shop_commands = CommandRegistry()
+
+SHOP_ITEMS = {"potion": 10, "bigpotion": 25, "armor": 50}  # name -> price
+
+def find_weapon(name):
+    """(name, damage list, price) for a weapon name, case-insensitive"""
+    for _, (weapon_name, dmg_list, price) in weapons.items():
+        if weapon_name.lower() == name.lower():
+            return weapon_name, dmg_list, price
+    return None
+
+def equip_weapon(player, name):
+    """Wield an owned weapon, with its damage scaled to the player's level"""
+    if name == "Fists":
+        dmg_list = [25, 22, 21, 30]
+    else:
+        name, dmg_list, _ = find_weapon(name)
+    player.weapon = name
+    player.attack = [dmg + 7 * (player.level - 1) for dmg in dmg_list]
+
+@shop_commands.command("help")
+def shop_help(arg):
+    game_output.write("Buy Sword | Buy Mace | Buy Axe | Buy Potion | Buy BigPotion | Buy Armor")
+    game_output.write("Equip Sword | Equip Mace | Equip Axe | Equip Fists | Exit")
+    game_output.write("Chain commands with ';' and repeat with xN, e.g. buy potion x3; equip axe; exit")
+
+@shop_commands.command("exit")
+def shop_exit(arg):
+    game_output.write("Exiting...")
+    create_empty_lines()
+    game_output.write(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
+    return LEAVE
+
+@shop_commands.command("equip")
+def shop_equip(arg):
+    names = [name.lower() for _, (name, _, _) in weapons.items()] + ["fists"]
+    wanted = resolve_name(arg, names) if arg else None
+    weapon_name = wanted.title() if wanted else arg.title()
+    if weapon_name not in Player_1.owned_weapons:
+        game_output.write(f"You don't own {weapon_name}!")
+        return STOP
+    equip_weapon(Player_1, weapon_name)
+    event_log.emit("equip", weapon_name)
+    game_output.write(Colors.OKGREEN + f"Equipped {weapon_name}!" + Colors.ENDC)
+    return STOP  # equipping twice does nothing new
+
+@shop_commands.command("buy")
+def shop_buy(arg):
+    weapon_names = [name.lower() for _, (name, _, _) in weapons.items()]
+    wanted = resolve_name(arg, list(SHOP_ITEMS) + weapon_names) if arg else None
+    if wanted is None:
+        game_output.write("Unknown item. Type 'help' for options.")
+        return STOP
+
+    if wanted == "potion":
+        if Player_1.gold < SHOP_ITEMS["potion"]:
+            game_output.write("You cannot afford a Potion...")
+            return STOP
+        Player_1.gold -= SHOP_ITEMS["potion"]
+        Player_1.health_potions += 1
+        event_log.emit("purchase", "Potion", SHOP_ITEMS["potion"], Player_1.gold)
+        game_output.write(Colors.OKGREEN + "You have purchased a Potion!" + Colors.ENDC)
+        game_output.write(f"You now have {Player_1.health_potions} potion(s)")
+        return KEEP
+
+    if wanted == "bigpotion":
+        if Player_1.gold < SHOP_ITEMS["bigpotion"]:
+            game_output.write("You cannot afford a Big Potion...")
+            return STOP
+        Player_1.gold -= SHOP_ITEMS["bigpotion"]
+        Player_1.big_potions += 1
+        event_log.emit("purchase", "BigPotion", SHOP_ITEMS["bigpotion"], Player_1.gold)
+        game_output.write(Colors.OKGREEN + "You have purchased a Big Potion!" + Colors.ENDC)
+        game_output.write(f"You now have {Player_1.big_potions} big potion(s)")
+        return KEEP
+
+    if wanted == "armor":
+        if Player_1.gold < SHOP_ITEMS["armor"]:
+            game_output.write("You cannot afford Armor...")
+            return STOP
+        if Player_1.armor >= 10:
+            game_output.write("You already have maximum armor!")
+            return STOP
+        Player_1.gold -= SHOP_ITEMS["armor"]
+        Player_1.armor += 5
+        event_log.emit("purchase", "Armor", SHOP_ITEMS["armor"], Player_1.gold)
+        game_output.write(Colors.OKBLUE + "You have purchased Armor! +5 damage reduction" + Colors.ENDC)
+        game_output.write(f"Current armor: {Player_1.armor} (blocks {Player_1.armor * 2} damage)")
+        return KEEP
+
+    name, _, price = find_weapon(wanted)
+    if name in Player_1.owned_weapons:
+        game_output.write(f"You already own the {name}! Use 'Equip {name}' to equip it.")
+    elif Player_1.gold < price:
+        game_output.write(f"You cannot afford the {name}...")
+    else:
+        Player_1.gold -= price
+        Player_1.owned_weapons[name] = True
+        equip_weapon(Player_1, name)
+        event_log.emit("purchase", name, price, Player_1.gold)
+        event_log.emit("equip", name)
+        game_output.write(Colors.OKGREEN + f"You have purchased and equipped the {name}!" + Colors.ENDC)
+    return STOP  # a weapon can only be bought once
+
 def shop_prompt():
+    """Read one line of shop commands and run it as a batch"""
     create_empty_lines()
-    answer = input(">: ").lower().strip()
-    if answer == "help":
+    answer = ask()
+    return run_batch(shop_commands, answer)
+
+def shop_encounter():
+    while True:
+        memory_probe.sample("shop")
+        clear_screen()
+        print_shop_art()
         create_empty_lines()
-        print("Buy Sword | Buy Mace | Buy Axe | Buy Potion | Buy BigPotion | Buy Armor")
-        print("Equip Sword | Equip Mace | Equip Axe | Equip Fists | Exit")
-        time.sleep(2.5)
-        shop_encounter()
-    elif answer == "exit":
-        print("Exiting...")
+        game_output.write(f"Gold: {Player_1.gold}")
         create_empty_lines()
-        print(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
-    
-    elif answer.startswith("equip"):
-        weapon_name = answer.replace("equip", "").strip().title()
+        game_output.write("===============")
+        game_output.write("WEAPONS:")
+        for _, (name, dmg_list, price) in weapons.items():
+            owned_marker = Colors.OKGREEN + " [OWNED]" + Colors.ENDC if name in Player_1.owned_weapons else ""
+            equipped_marker = Colors.OKCYAN + " [EQUIPPED]" + Colors.ENDC if name == Player_1.weapon else ""
+            game_output.write(f"  {name} | Price: {price}{owned_marker}{equipped_marker}")
         
-        if weapon_name in Player_1.owned_weapons:
-            # Find the weapon stats
-            weapon_found = False
-            if weapon_name == "Fists":
-                Player_1.weapon = "Fists"
-                Player_1.attack = [25, 22, 21, 30]
-                # Apply level scaling
-                for _ in range(Player_1.level - 1):
-                    Player_1.attack = [dmg + 7 for dmg in Player_1.attack]
-                weapon_found = True
-            else:
-                for _, (name, dmg_list, price) in weapons.items():
-                    if name == weapon_name:
-                        Player_1.weapon = name
-                        Player_1.attack = dmg_list.copy()
-                        # Apply level scaling
-                        for _ in range(Player_1.level - 1):
-                            Player_1.attack = [dmg + 7 for dmg in Player_1.attack]
-                        weapon_found = True
-                        break
-            
-            if weapon_found:
-                print(Colors.OKGREEN + f"Equipped {weapon_name}!" + Colors.ENDC)
+        # Show Fists option
+        equipped_fists = Colors.OKCYAN + " [EQUIPPED]" + Colors.ENDC if Player_1.weapon == "Fists" else ""
+        game_output.write(f"  Fists | Always owned{equipped_fists}")
+        
+        game_output.write("")
+        game_output.write("ITEMS:")
+        game_output.write(f"  Potion | Price: {SHOP_ITEMS['potion']} (heals 30-50 HP)")
+        game_output.write(f"  BigPotion | Price: {SHOP_ITEMS['bigpotion']} (heals 50-100 HP)")
+        game_output.write(f"  Armor | Price: {SHOP_ITEMS['armor']} (+5 armor, blocks 10 dmg per piece, max 10)")
+        game_output.write("===============")
+        if shop_prompt() == LEAVE:
+            return
+        # One pause and redraw per batch, however many commands it held
+        game_output.pause(1.0)
+
+def game_over():
+    memory_probe.sample("game_over")
+    clear_screen()
+    game_output.write(Colors.FAIL + "=" * 40)
+    game_output.write("           GAME OVER")
+    game_output.write("      You have been defeated!")
+    game_output.write("=" * 40 + Colors.ENDC)
+    game_output.write("")
+    game_output.write(f"Final Level: {Player_1.level}")
+    game_output.write(f"Total Gold Collected: {Player_1.total_gold}")
+    game_output.write(f"Enemies Defeated: {Player_1.enemies_killed}")
+    game_output.write("")
+    game_output.write("Thanks for playing X-Man!")
+    live_stats.publish(turn_counter, Player_1, enemy_list)  # the final turn, before the loop is gone
+    sys.exit()
+
+# ========================
+# Spawn and loot tables
+# ========================
+class AliasSampler:
+    """Walker/Vose alias table: O(n) to build, O(1) per sample"""
+    def __init__(self, entries):
+        outcomes = [outcome for outcome, _ in entries]
+        weights = [float(weight) for _, weight in entries]
+        total = sum(weights)
+        if not outcomes or total <= 0:
+            raise ValueError("weighted table needs at least one positive weight")
+        n = len(outcomes)
+        scaled = [weight * n / total for weight in weights]
+        self.outcomes = outcomes
+        self.prob = [1.0] * n
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # whatever is left is 1.0 up to rounding error
+
+    def sample(self):
+        column = int(random.random() * len(self.outcomes))
+        if random.random() < self.prob[column]:
+            return self.outcomes[column]
+        return self.outcomes[self.alias[column]]
+
+    def sample_many(self, count):
+        outcomes, prob, alias = self.outcomes, self.prob, self.alias
+        n = len(outcomes)
+        picks = []
+        for _ in range(count):
+            column = int(random.random() * n)
+            picks.append(outcomes[column] if random.random() < prob[column] else outcomes[alias[column]])
+        return picks
+
+class WeightedTables:
+    """Declarative {key: [(outcome, weight), ...]} tables, compiled into alias
+    samplers on first use and recompiled only after a table is replaced.
+    Tables are stored as tuples, so replacing one is the only way to edit it"""
+    def __init__(self, tables):
+        self.tables = {key: tuple(entries) for key, entries in tables.items()}
+        self.samplers = {}
+
+    def __setitem__(self, key, entries):
+        self.tables[key] = tuple(entries)
+        self.samplers.pop(key, None)
+
+    def __getitem__(self, key):
+        return self.tables[key]
+
+    def sampler(self, key):
+        sampler = self.samplers.get(key)
+        if sampler is None:
+            sampler = self.samplers[key] = AliasSampler(self.tables[key])
+        return sampler
+
+    def sample(self, key):
+        return self.sampler(key).sample()
+
+    def sample_many(self, key, count):
+        return self.sampler(key).sample_many(count)
+
+def uniform_drop(lo, hi, bonus=0):
+    """Every amount from lo to hi equally likely, plus a flat bonus"""
+    return [(amount + bonus, 1) for amount in range(lo, hi + 1)]
+
+# Enemy types that respawn, keyed by the lowest player level of each bracket
+spawn_tables = WeightedTables({
+    1: [("normal", 100)],
+    4: [("agile", 30), ("fire", 20), ("normal", 50)],
+    5: [("darkness", 15), ("agile", 25), ("fire", 15), ("normal", 45)],  # darkness is rare
+})
+
+# (enemy type, drop) -> amounts; "xp"/"gold" are paid on kill, "search_gold" by searching the corpse
+drop_tables = WeightedTables({
+    ("normal", "xp"):            uniform_drop(30, 50),
+    ("agile", "xp"):             uniform_drop(30, 50, 20),
+    ("fire", "xp"):              uniform_drop(30, 50, 30),
+    ("darkness", "xp"):          uniform_drop(30, 50, 50),
+    ("normal", "gold"):          uniform_drop(10, 15),
+    ("agile", "gold"):           uniform_drop(10, 15, 5),
+    ("fire", "gold"):            uniform_drop(10, 15, 10),
+    ("darkness", "gold"):        uniform_drop(10, 15, 15),
+    ("normal", "search_gold"):   uniform_drop(3, 8),
+    ("agile", "search_gold"):    uniform_drop(3, 8, 2),
+    ("fire", "search_gold"):     uniform_drop(3, 8, 3),
+    ("darkness", "search_gold"): uniform_drop(3, 8, 5),
+})
+
+def spawn_bracket(player_level):
+    return max(level for level in spawn_tables.tables if level <= player_level)
+
+def spawn_enemy_by_level(player_level):
+    """Determine enemy type based on player level"""
+    return spawn_tables.sample(spawn_bracket(player_level))
+
+def spawn_enemies_by_level(player_level, count):
+    """Enemy types for a whole batch of respawns"""
+    return spawn_tables.sample_many(spawn_bracket(player_level), count)
+
+# ========================
+# Snapshots
+# ========================
+WorldSnapshot = collections.namedtuple("WorldSnapshot", "turn player inventory chunks")
+SNAPSHOT_CHUNK = 32  # enemies per shared chunk
+
+def effect_records(character):
+    if not character.effects:
+        return ()
+    return tuple((effect.name, effect.power, effect.turns) for effect in character.effects)
+
+def player_record(player):
+    return (player.x, player.y, player.health, player.max_health, tuple(player.attack),
+            player.weapon, player.level, player.xp, player.gold, player.armor,
+            player.total_gold, player.enemies_killed, effect_records(player))
+
+def inventory_record(player):
+    return (player.health_potions, player.big_potions, tuple(player.owned_weapons))
+
+def enemy_record(enemy):
+    return (enemy.x, enemy.y, enemy.health, enemy.max_health, tuple(enemy.attack),
+            enemy.enemy_type, enemy.is_dead, enemy.respawn_timer, enemy.searched,
+            enemy.loot_given, enemy.attack_counter, effect_records(enemy))
+
+class WorldHistory:
+    """Per-turn world snapshots built from immutable tuples.
+
+    Enemies mark themselves changed when written to, so a turn only rebuilds
+    the records and chunks of those enemies and shares everything else with
+    the previous snapshot. Rewinding writes back only the chunks the target
+    turn does not share with the latest one and drops later turns from the
+    newest end.
+    """
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.snapshots = {}  # turn -> WorldSnapshot
+        self.latest = None
+        self.enemies = None   # the list the latest snapshot was taken from
+        self.positions = {}   # enemy -> index in that list
+        self.with_effects = set()  # enemies whose latest record holds effects
+
+    def __contains__(self, turn):
+        return turn in self.snapshots
+
+    def record(self, turn, player, enemies):
+        prev = self.latest
+        player_rec = player_record(player)
+        inventory_rec = inventory_record(player)
+        old_chunks = ()
+        if prev is not None:
+            if player_rec == prev.player:
+                player_rec = prev.player
+            if inventory_rec == prev.inventory:
+                inventory_rec = prev.inventory
+            old_chunks = prev.chunks
+
+        if Enemy.changed is None:
+            Enemy.changed = set()
+        if prev is None or enemies is not self.enemies or len(enemies) != len(self.positions):
+            chunks = self._chunks_from_scratch(enemies)
+        else:
+            chunks = self._chunks_from_changes(old_chunks)
+        Enemy.changed.clear()
+
+        snapshot = WorldSnapshot(turn, player_rec, inventory_rec, chunks)
+        self.snapshots[turn] = snapshot
+        self.latest = snapshot
+        while len(self.snapshots) > self.limit:
+            del self.snapshots[next(iter(self.snapshots))]  # oldest first
+        return snapshot
+
+    def _chunks_from_scratch(self, enemies):
+        self.enemies = enemies
+        self.positions = {enemy: i for i, enemy in enumerate(enemies)}
+        self.with_effects = {enemy for enemy in enemies if enemy.effects}
+        return tuple(tuple(enemy_record(enemy) for enemy in enemies[start:start + SNAPSHOT_CHUNK])
+                     for start in range(0, len(enemies), SNAPSHOT_CHUNK))
+
+    def _chunks_from_changes(self, old_chunks):
+        # Effects change inside lists the enemy never reassigns, so anyone that
+        # has or just lost effects is looked at too
+        suspects = Enemy.changed | self.with_effects
+        suspects.update(entity for entity in effect_scheduler.queues if entity in self.positions)
+        rebuilt = {}  # chunk index -> list of records
+        for enemy in suspects:
+            index = self.positions.get(enemy)
+            if index is None:
+                continue
+            chunk, slot = divmod(index, SNAPSHOT_CHUNK)
+            rec = enemy_record(enemy)
+            if rec != old_chunks[chunk][slot]:
+                rebuilt.setdefault(chunk, list(old_chunks[chunk]))[slot] = rec
+            if enemy.effects:
+                self.with_effects.add(enemy)
             else:
-                print(f"You don't own {weapon_name}!")
+                self.with_effects.discard(enemy)
+        if not rebuilt:
+            return old_chunks
+        chunks = list(old_chunks)
+        for chunk, records in rebuilt.items():
+            chunks[chunk] = tuple(records)
+        return tuple(chunks)
+
+    def restore(self, turn, player, enemies):
+        """Put the live world back to how it was at the end of turn and forget later turns"""
+        snapshot = self.snapshots[turn]
+        (player.x, player.y, player.health, player.max_health, attack,
+         player.weapon, player.level, player.xp, player.gold, player.armor,
+         player.total_gold, player.enemies_killed, effects) = snapshot.player
+        player.attack = list(attack)
+        effect_scheduler.restore(player, effects)
+        player.health_potions, player.big_potions, owned = snapshot.inventory
+        player.owned_weapons = {name: True for name in owned}
+
+        if enemies is self.enemies and len(enemies) == len(self.positions):
+            # Only chunks the two snapshots do not share, plus anything touched
+            # since the latest one, can differ from the target turn
+            current = self.latest.chunks
+            stale = {self.positions[enemy] for enemy in Enemy.changed | self.with_effects if enemy in self.positions}
+            for index, chunk in enumerate(snapshot.chunks):
+                if current[index] is not chunk:
+                    stale.update(range(index * SNAPSHOT_CHUNK, index * SNAPSHOT_CHUNK + len(chunk)))
         else:
-            print(f"You don't own {weapon_name}!")
-        time.sleep(1.0)
-        shop_encounter()
-    
-    elif answer.startswith("buy"):
-        wanted = answer.replace("buy", "").strip().title()
-        
-        # Check for potion
-        if wanted == "Potion":
-            potion_price = 10
-            if Player_1.gold < potion_price:
-                print("You cannot afford a Potion...")
+            self.enemies = enemies
+            self.positions = {enemy: i for i, enemy in enumerate(enemies)}
+            stale = range(len(enemies))
+        for i in stale:
+            enemy = enemies[i]
+            rec = snapshot.chunks[i // SNAPSHOT_CHUNK][i % SNAPSHOT_CHUNK]
+            (enemy.x, enemy.y, enemy.health, enemy.max_health, attack,
+             enemy.enemy_type, enemy.is_dead, enemy.respawn_timer, enemy.searched,
+             enemy.loot_given, enemy.attack_counter, effects) = rec
+            enemy.attack = list(attack)
+            effect_scheduler.restore(enemy, effects)
+            if effects:
+                self.with_effects.add(enemy)
             else:
-                Player_1.gold -= potion_price
-                Player_1.health_potions += 1
-                print(Colors.OKGREEN + "You have purchased a Potion!" + Colors.ENDC)
-                print(f"You now have {Player_1.health_potions} potion(s)")
-            time.sleep(1.0)
-            shop_encounter()
+                self.with_effects.discard(enemy)
+        # Every enemy now matches the target snapshot, so nothing is dirty
+        Enemy.changed.clear()
+
+        while next(reversed(self.snapshots)) > turn:
+            self.snapshots.popitem()  # turns are recorded in order, so later ones are at the end
+        self.latest = snapshot
+        return snapshot
+
+world_history = WorldHistory()
+
+# ========================
+# Multiplayer
+# ========================
+TICK_SECONDS = 0.1
+
+# Level of detail for the shared world. Enemies inside a viewport move with
+# the players; out of view they drift one step every AMBIENT_PERIOD ticks.
+# The ring LOD_MARGIN cells around each viewport is simulated in batches every
+# LOD_MID_INTERVAL ticks; anything further is frozen and caught up in one go
+# (exactly for short gaps, as a bounded random walk for long ones) when it
+# comes back in range.
+AMBIENT_PERIOD = 4
+LOD_MARGIN = 16
+LOD_MID_INTERVAL = 4
+LOD_EXACT_STEPS = 12
+
+class SpatialGrid:
+    """Buckets entities by coarse cell so area queries only touch nearby cells"""
+    def __init__(self, cell_size=8):
+        self.cell_size = cell_size
+        self.cells = {}  # (cx, cy) -> set of entities
+        self.where = {}  # entity -> (cx, cy)
+
+    def _cell(self, entity):
+        return (entity.x // self.cell_size, entity.y // self.cell_size)
+
+    def insert(self, entity):
+        cell = self._cell(entity)
+        self.cells.setdefault(cell, set()).add(entity)
+        self.where[entity] = cell
+
+    def remove(self, entity):
+        cell = self.where.pop(entity, None)
+        if cell is not None:
+            bucket = self.cells[cell]
+            bucket.discard(entity)
+            if not bucket:
+                del self.cells[cell]
+
+    def update(self, entity):
+        """Call after an entity moves"""
+        if self.where.get(entity) != self._cell(entity):
+            self.remove(entity)
+            self.insert(entity)
+
+    def query(self, x0, y0, x1, y1):
+        """Entities with x0 <= x < x1 and y0 <= y < y1"""
+        size = self.cell_size
+        found = []
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                for entity in self.cells.get((cx, cy), ()):
+                    if x0 <= entity.x < x1 and y0 <= entity.y < y1:
+                        found.append(entity)
+        return found
+
+    def __len__(self):
+        return len(self.where)
+
+class ClientSession:
+    """One connected player on the world server"""
+    def __init__(self, sock, player):
+        self.sock = sock
+        self.player = player
+        self.inbox = b""
+        self.outbox = b""
+        self.commands = collections.deque()
+        self.messages = []
+        self.engaged = None  # enemy this player is fighting
+        self.fled = None     # enemy just run from; no re-encounter until the player moves
+        self.defeated = False
+        self.linger_until = None  # tick a defeated session is dropped at, sent or not
+        self.last_snapshot = None
+
+class LocalEnemyField:
+    """Every enemy of the shared world in this process, stepped by level of detail"""
+    def __init__(self, enemies, width, height):
+        self.width = width
+        self.height = height
+        self.tick = 0
+        self.grid = SpatialGrid()
+        self.locked = set()
+        self.respawns = []  # heap of (tick, seq, enemy)
+        self.seq = 0
+        for enemy in enemies:
+            self.grid.insert(enemy)
+
+    def __len__(self):
+        return len(self.grid) + len(self.respawns)
+
+    def query(self, x0, y0, x1, y1):
+        return self.grid.query(x0, y0, x1, y1)
+
+    def lock(self, enemy):
+        self.locked.add(enemy)
+
+    def unlock(self, enemy):
+        self.locked.discard(enemy)
+
+    def kill(self, enemy, respawn_at):
+        self.grid.remove(enemy)
+        self.seq += 1
+        heapq.heappush(self.respawns, (respawn_at, self.seq, enemy))
+
+    def advance(self, tick, views):
+        """views is [(viewport, move key or None)] for every active player"""
+        self.tick = tick
+
+        # Respawns are scheduled at death, so nothing polls dead enemies
+        while self.respawns and self.respawns[0][0] <= tick:
+            _, _, enemy = heapq.heappop(self.respawns)
+            enemy.x = random.randint(3, self.width - 1)
+            enemy.y = random.randint(3, self.height - 1)
+            enemy.respawn_timer = 0
+            enemy.last_update = tick
+            enemy.reset_health()
+            self.grid.insert(enemy)
+
+        # Step only enemies in or around a viewport; cost follows the active region
+        stepped = set()
+        for (x0, y0, x1, y1), key in views:
+            nearby = self.grid.query(x0 - LOD_MARGIN, y0 - LOD_MARGIN, x1 + LOD_MARGIN, y1 + LOD_MARGIN)
+            for enemy in nearby:
+                if enemy in stepped or enemy in self.locked:
+                    continue
+                owed = (tick - enemy.last_update) // AMBIENT_PERIOD
+                if x0 <= enemy.x < x1 and y0 <= enemy.y < y1:
+                    # In view: settle any drift owed from before, then follow the mover
+                    self._drift(enemy, owed)
+                    enemy.last_update = tick
+                    if key is not None:
+                        axis, limit = ('y', self.height) if key in ('w', 's') else ('x', self.width)
+                        wander_enemy(enemy, axis, limit)
+                elif tick - enemy.last_update >= LOD_MID_INTERVAL:
+                    self._drift(enemy, owed)
+                    enemy.last_update += owed * AMBIENT_PERIOD
+                else:
+                    continue
+                stepped.add(enemy)
+                self.grid.update(enemy)
+
+    def _drift(self, enemy, steps):
+        """Apply ambient wander steps an enemy skipped while it was not simulated"""
+        if steps <= LOD_EXACT_STEPS:
+            for _ in range(steps):
+                if random.random() < 0.5:
+                    wander_enemy(enemy, 'x', self.width)
+                else:
+                    wander_enemy(enemy, 'y', self.height)
             return
-        
-        # Check for big potion
-        if wanted == "Bigpotion":
-            bigpotion_price = 25
-            if Player_1.gold < bigpotion_price:
-                print("You cannot afford a Big Potion...")
+        # Each axis gets about steps/2 moves of -1/0/+1 (variance 2/3 each), so the
+        # net displacement is roughly normal with variance steps/3, kept off the edges
+        spread = math.sqrt(steps / 3)
+        enemy.x = reflect(enemy.x + round(random.gauss(0, spread)), 1, self.width - 2)
+        enemy.y = reflect(enemy.y + round(random.gauss(0, spread)), 1, self.height - 2)
+
+# Columns of the shared enemy table, one int32 per enemy each
+FIELD_X, FIELD_Y, FIELD_ALIVE, FIELD_RESPAWN_AT, FIELD_LOCKED = range(5)
+FIELD_COLUMNS = 5
+
+def field_columns(buf, count):
+    """Split a shared buffer into the FIELD_* int32 columns"""
+    return [buf[c * count * 4:(c + 1) * count * 4].cast('i') for c in range(FIELD_COLUMNS)]
+
+def region_of(x, width, regions):
+    """Index of the vertical strip that owns column x"""
+    return min(regions - 1, x * regions // width)
+
+class RegionEnemy:
+    """A worker's view of one enemy: its row in the shared table and a position"""
+    __slots__ = ("index", "x", "y")
+
+    def __init__(self, index, x, y):
+        self.index = index
+        self.x = x
+        self.y = y
+
+def region_worker(shm_name, count, region, regions, width, height, owned, conn, seed):
+    """Worker process loop: advance one strip of the world per tick message"""
+    random.seed(seed)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    X, Y, ALIVE, RESPAWN_AT, LOCKED = columns = field_columns(shm.buf, count)
+    grid = SpatialGrid()
+    buckets = [set() for _ in range(AMBIENT_PERIOD)]  # ambient wander is staggered by index
+    respawns = []  # heap of (tick, index) for this strip's dead enemies
+    proxies = {}
+
+    def adopt(index):
+        proxy = proxies[index] = RegionEnemy(index, X[index], Y[index])
+        grid.insert(proxy)
+        buckets[index % AMBIENT_PERIOD].add(index)
+
+    for index in owned:
+        adopt(index)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        tick, views, arrivals, deaths = message
+        for index in arrivals:
+            adopt(index)
+        for index in deaths:
+            heapq.heappush(respawns, (RESPAWN_AT[index], index))
+
+        # Respawns are due on their tick, wherever the corpse lies
+        moved = set()
+        while respawns and respawns[0][0] <= tick:
+            index = heapq.heappop(respawns)[1]
+            proxy = proxies[index]
+            proxy.x = random.randint(3, width - 1)
+            proxy.y = random.randint(3, height - 1)
+            ALIVE[index] = 1
+            moved.add(index)
+
+        # In view, enemies only move with the player who moved
+        in_view = set()
+        for (x0, y0, x1, y1), key in views:
+            for proxy in grid.query(x0, y0, x1, y1):
+                index = proxy.index
+                in_view.add(index)
+                if key is None or index in moved or not ALIVE[index] or LOCKED[index]:
+                    continue
+                axis, limit = ('y', height) if key in ('w', 's') else ('x', width)
+                wander_enemy(proxy, axis, limit)
+                moved.add(index)
+
+        # Everything else in the strip drifts, a quarter of it each tick
+        for index in buckets[tick % AMBIENT_PERIOD]:
+            if index in in_view or index in moved or not ALIVE[index] or LOCKED[index]:
+                continue
+            proxy = proxies[index]
+            if random.random() < 0.5:
+                wander_enemy(proxy, 'x', width)
             else:
-                Player_1.gold -= bigpotion_price
-                Player_1.big_potions += 1
-                print(Colors.OKGREEN + "You have purchased a Big Potion!" + Colors.ENDC)
-                print(f"You now have {Player_1.big_potions} big potion(s)")
-            time.sleep(1.0)
-            shop_encounter()
+                wander_enemy(proxy, 'y', height)
+            moved.add(index)
+
+        handoffs = []
+        for index in moved:
+            proxy = proxies[index]
+            X[index] = proxy.x
+            Y[index] = proxy.y
+            grid.update(proxy)
+            owner = region_of(proxy.x, width, regions)
+            if owner != region:
+                handoffs.append((index, owner))
+        visible = [proxy.index for rect, _ in views for proxy in grid.query(*rect) if ALIVE[proxy.index]]
+        for index, _ in handoffs:
+            proxy = proxies.pop(index)
+            grid.remove(proxy)
+            buckets[index % AMBIENT_PERIOD].discard(index)
+        conn.send((visible, handoffs))
+    del X, Y, ALIVE, RESPAWN_AT, LOCKED
+    for column in columns:
+        column.release()
+    shm.close()
+
+class ParallelEnemyField:
+    """The shared world's enemies split into vertical strips, one worker process each.
+
+    Positions and flags live in a shared-memory table. Every tick the workers
+    advance their strips in parallel, wander, respawns and all, and reply with
+    the enemies inside any viewport plus those that crossed into another
+    strip, which the new owner adopts on the next tick. Only visible enemies
+    are copied back into Enemy objects, so the server's encounter and
+    snapshot code works on them unchanged.
+    """
+    def __init__(self, enemies, width, height, workers):
+        self.enemies = list(enemies)
+        self.index = {enemy: i for i, enemy in enumerate(self.enemies)}
+        self.regions = workers
+        self.visible = SpatialGrid()
+        count = len(self.enemies)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, count * FIELD_COLUMNS * 4))
+        self.columns = field_columns(self.shm.buf, count)
+        X, Y, ALIVE = self.columns[FIELD_X], self.columns[FIELD_Y], self.columns[FIELD_ALIVE]
+        self.owners = [region_of(enemy.x, width, workers) for enemy in self.enemies]
+        owned = [[] for _ in range(workers)]
+        for i, enemy in enumerate(self.enemies):
+            X[i], Y[i], ALIVE[i] = enemy.x, enemy.y, 1
+            owned[self.owners[i]].append(i)
+        self.arrivals = [[] for _ in range(workers)]
+        self.deaths = [[] for _ in range(workers)]  # killed since the last tick, by owner
+        self.connections = []
+        self.processes = []
+        for region in range(workers):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=region_worker, daemon=True,
+                args=(self.shm.name, count, region, workers, width, height, owned[region], child, random.getrandbits(32)))
+            process.start()
+            child.close()
+            self.connections.append(conn)
+            self.processes.append(process)
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self.enemies)
+
+    def query(self, x0, y0, x1, y1):
+        return self.visible.query(x0, y0, x1, y1)
+
+    def lock(self, enemy):
+        self.columns[FIELD_LOCKED][self.index[enemy]] = 1
+
+    def unlock(self, enemy):
+        self.columns[FIELD_LOCKED][self.index[enemy]] = 0
+
+    def kill(self, enemy, respawn_at):
+        # Workers are idle between ticks, so the table can be written directly
+        i = self.index[enemy]
+        self.columns[FIELD_ALIVE][i] = 0
+        self.columns[FIELD_RESPAWN_AT][i] = respawn_at
+        self.deaths[self.owners[i]].append(i)
+        self.visible.remove(enemy)
+
+    def advance(self, tick, views):
+        """views is [(viewport, move key or None)] for every active player"""
+        for conn, arrivals, deaths in zip(self.connections, self.arrivals, self.deaths):
+            conn.send((tick, views, arrivals, deaths))
+        self.arrivals = [[] for _ in range(self.regions)]
+        self.deaths = [[] for _ in range(self.regions)]
+        seen = set()
+        for conn in self.connections:
+            visible, handoffs = conn.recv()
+            seen.update(visible)
+            for index, owner in handoffs:
+                self.arrivals[owner].append(index)
+                self.owners[index] = owner
+        X, Y = self.columns[FIELD_X], self.columns[FIELD_Y]
+        self.visible = SpatialGrid()
+        for index in seen:
+            enemy = self.enemies[index]
+            enemy.x, enemy.y = X[index], Y[index]
+            if enemy.is_dead:  # respawned by its worker
+                enemy.reset_health()
+            self.visible.insert(enemy)
+
+    def close(self):
+        if self.shm is None:
             return
-        
-        # Check for armor
-        if wanted == "Armor":
-            armor_price = 50
-            if Player_1.gold < armor_price:
-                print("You cannot afford Armor...")
-            elif Player_1.armor >= 10:
-                print("You already have maximum armor!")
-            else:
-                Player_1.gold -= armor_price
-                Player_1.armor += 5
-                print(Colors.OKBLUE + "You have purchased Armor! +5 damage reduction" + Colors.ENDC)
-                print(f"Current armor: {Player_1.armor} (blocks {Player_1.armor * 2} damage)")
-            time.sleep(1.0)
-            shop_encounter()
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        for column in self.columns:
+            column.release()
+        self.columns = []
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+class WorldServer:
+    """Authoritative shared world over local sockets.
+
+    Each tick applies at most one queued command per player, advances the
+    enemies by level of detail (in view they follow the player who moved, in
+    the ring around a view they drift in batches, and frozen ones catch up in
+    bulk when a view reaches them), and resolves contested encounters in a
+    turn order that rotates every tick. Each client is sent only the entities
+    inside its own viewport, and only when that view changed. With
+    workers > 1 the enemies are simulated by a ParallelEnemyField instead.
+    """
+    MAX_QUEUED = 64
+    MAX_OUTBOX = 1 << 20
+    DEFEAT_LINGER = 50  # ticks to flush a defeated player's last snapshot
+
+    def __init__(self, width=120, height=60, enemy_count=40, tick_seconds=TICK_SECONDS, workers=1):
+        self.width = max(width, BOARD_WIDTH)
+        self.height = max(height, BOARD_HEIGHT)
+        self.tick_seconds = tick_seconds
+        self.tick = 0
+        self.sessions = {}     # socket -> ClientSession
+        self.by_player = {}    # Player -> ClientSession
+        self.locks = {}        # Enemy -> ClientSession fighting it
+        self.players = SpatialGrid()
+        self.shops = SpatialGrid()
+        enemies = [Enemy(random.randint(3, self.width - 1), random.randint(3, self.height - 1), 50, [20, 18, 17, 25], "normal")
+                   for _ in range(enemy_count)]
+        if workers > 1:
+            self.enemies = ParallelEnemyField(enemies, self.width, self.height, workers)
+        else:
+            self.enemies = LocalEnemyField(enemies, self.width, self.height)
+        for x, y in ((1, 1), (self.width // 2, self.height // 2), (self.width - 2, self.height - 2)):
+            self.shops.insert(Shop(x, y))
+        self.selector = selectors.DefaultSelector()
+
+    # ---- networking ----
+    def serve(self, host="127.0.0.1", port=7777):
+        listener = socket.create_server((host, port))
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, self._accept)
+        game_output.write(f"X-Man world server on {host}:{port} ({self.width}x{self.height}, {len(self.enemies)} enemies)")
+        next_tick = time.monotonic()
+        while True:
+            next_tick = max(next_tick + self.tick_seconds, time.monotonic())
+            while True:
+                timeout = next_tick - time.monotonic()
+                if timeout <= 0:
+                    break
+                for key, _ in self.selector.select(timeout):
+                    key.data(key.fileobj)
+            self.step()
+            self.send_snapshots()
+
+    def _accept(self, listener):
+        sock, _ = listener.accept()
+        sock.setblocking(False)
+        player = Player(4, 4, 100, [25, 22, 21, 30], "Fists", 1, 0, 0)
+        session = ClientSession(sock, player)
+        self.sessions[sock] = session
+        self.by_player[player] = session
+        self.players.insert(player)
+        self.selector.register(sock, selectors.EVENT_READ, self._read)
+        session.messages.append(Colors.OKGREEN + "Press W/A/S/D Keys to Move..." + Colors.ENDC)
+
+    def _read(self, sock):
+        session = self.sessions[sock]
+        try:
+            data = sock.recv(4096)
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(session)
             return
-        
-        # Check weapons
-        for _, (name, dmg_list, price) in weapons.items():
-            if name == wanted:
-                if wanted in Player_1.owned_weapons:
-                    print(f"You already own the {name}! Use 'Equip {name}' to equip it.")
-                elif Player_1.gold < price:
-                    print(f"You cannot afford the {name}...")
+        session.inbox += data
+        while b"\n" in session.inbox:
+            line, session.inbox = session.inbox.split(b"\n", 1)
+            if len(session.commands) < self.MAX_QUEUED:
+                session.commands.append(line.decode(errors="replace").strip().lower())
+
+    def _drop(self, session):
+        self.selector.unregister(session.sock)
+        session.sock.close()
+        self._release(session)
+        effect_scheduler.forget(session.player)
+        self.players.remove(session.player)
+        del self.sessions[session.sock]
+        del self.by_player[session.player]
+
+    # ---- simulation ----
+    def _turn_order(self):
+        sessions = list(self.sessions.values())
+        if not sessions:
+            return sessions
+        first = self.tick % len(sessions)
+        return sessions[first:] + sessions[:first]
+
+    def _viewport(self, player):
+        x0 = clamp(player.x - BOARD_WIDTH // 2, 0, self.width - BOARD_WIDTH)
+        y0 = clamp(player.y - BOARD_HEIGHT // 2, 0, self.height - BOARD_HEIGHT)
+        return x0, y0, x0 + BOARD_WIDTH, y0 + BOARD_HEIGHT
+
+    def _release(self, session):
+        if session.engaged is not None:
+            self.locks.pop(session.engaged, None)
+            self.enemies.unlock(session.engaged)
+            session.engaged = None
+
+    def step(self):
+        self.tick += 1
+
+        moved = []
+        for session in self._turn_order():
+            if session.defeated or not session.commands:
+                continue
+            command = session.commands.popleft()
+            if session.engaged is not None:
+                self._combat(session, command)
+            elif command in MOVE_KEYS:
+                player = session.player
+                moved.append((session, command, player.x, player.y))
+                if command == 'w':
+                    player.y = clamp(player.y - 1, 0, self.height - 1)
+                elif command == 's':
+                    player.y = clamp(player.y + 1, 0, self.height - 1)
+                elif command == 'a':
+                    player.x = clamp(player.x - 1, 0, self.width - 1)
                 else:
-                    Player_1.gold -= price
-                    Player_1.owned_weapons[name] = True
-                    Player_1.attack = dmg_list.copy()
-                    # Apply level scaling
-                    for _ in range(Player_1.level - 1):
-                        Player_1.attack = [dmg + 7 for dmg in Player_1.attack]
-                    Player_1.weapon = name
-                    print(Colors.OKGREEN + f"You have purchased and equipped the {name}!" + Colors.ENDC)
-                time.sleep(1.0)
-                shop_encounter()
+                    player.x = clamp(player.x + 1, 0, self.width - 1)
+                self.players.update(player)
+
+        keys = {session: key for session, key, _, _ in moved}
+        self.enemies.advance(self.tick, [(self._viewport(session.player), keys.get(session))
+                                         for session in self.sessions.values() if not session.defeated])
+
+        # Sharing a cell with an enemy locks it, whether the player stepped onto it
+        # or it wandered onto them; a mover who comes second this tick is bounced back
+        origins = {session: (old_x, old_y) for session, _, old_x, old_y in moved}
+        for session in self._turn_order():
+            if session.defeated or session.engaged is not None:
+                continue
+            player = session.player
+            if session in origins:
+                session.fled = None
+            for enemy in self.enemies.query(player.x, player.y, player.x + 1, player.y + 1):
+                if enemy is session.fled:
+                    continue
+                holder = self.locks.get(enemy)
+                if holder is None:
+                    self.locks[enemy] = session
+                    self.enemies.lock(enemy)
+                    session.engaged = enemy
+                    enemy.reset_health()
+                    enemy.scale_to_level(player.level)
+                    session.messages.append(f"YOU HAVE ENCOUNTERED {enemy.enemy_type.upper()} ENEMY! (attack | run)")
+                elif session in origins:
+                    player.x, player.y = origins[session]
+                    self.players.update(player)
+                    session.messages.append("Another player is already fighting that enemy!")
+                break
+
+    def _combat(self, session, command):
+        player = session.player
+        enemy = session.engaged
+        if command == "attack":
+            # Effects tick once per attack, as in single-player combat
+            for entity, effect in effect_scheduler.tick(player) + effect_scheduler.tick(enemy):
+                if effect.power > 0:
+                    session.messages.append(effect_tick_line(entity, effect))
+            if player.health <= 0:
+                self._defeat(session)
                 return
-        print("Unknown item. Type 'help' for options.")
-        time.sleep(0.8)
-        shop_encounter()
-    else:
-        print("Unknown Command, type 'help' for help!")
-        time.sleep(0.8)
-        shop_encounter()
+            if enemy.health <= 0:
+                self._kill(session)
+                return
+            _, lines = player_strike(player, enemy)
+            session.messages.extend(lines)
+            if enemy.health <= 0:
+                self._kill(session)
+                return
+            session.messages.extend(enemy_strike(enemy, player))
+            if player.health <= 0:
+                self._defeat(session)
+        elif command == "run":
+            if random.randint(0, 1) == 0:
+                session.messages.append("The enemy has caught you...")
+            else:
+                session.messages.append("Got away safe and sound...")
+                session.fled = session.engaged
+                self._release(session)
+        else:
+            session.messages.append("Unknown Command: attack | run")
+
+    def _kill(self, session):
+        player = session.player
+        enemy = session.engaged
+        xp_reward, gold_reward, leveled_up = grant_kill_rewards(player, enemy)
+        session.messages.append(f"YOU HAVE KILLED AN ENEMY! +{xp_reward} XP, +{gold_reward} Gold")
+        if leveled_up:
+            player.clear_effects()
+            session.messages.append(Colors.OKGREEN + f"★★★ LEVEL UP! ★★★ You are now level {player.level}!" + Colors.ENDC)
+        self._release(session)
+        respawn_time = 120 if enemy.enemy_type == "darkness" else 50
+        new_type = spawn_enemy_by_level(player.level)
+        if enemy.enemy_type != "darkness" or new_type == "darkness":
+            enemy.enemy_type = new_type
+        self.enemies.kill(enemy, self.tick + respawn_time)
+
+    def _defeat(self, session):
+        session.defeated = True
+        session.linger_until = self.tick + self.DEFEAT_LINGER
+        self._release(session)
+        player = session.player
+        session.messages.append(Colors.FAIL + f"GAME OVER - Level {player.level}, {player.total_gold} Gold, {player.enemies_killed} kills" + Colors.ENDC)
+
+    # ---- replication ----
+    def snapshot(self, session):
+        """Everything this client can see, in viewport coordinates"""
+        player = session.player
+        x0, y0, x1, y1 = self._viewport(player)
+        cells = [[shop.x - x0, shop.y - y0, "shop"] for shop in self.shops.query(x0, y0, x1, y1)]
+        cells += [[enemy.x - x0, enemy.y - y0, enemy.enemy_type] for enemy in self.enemies.query(x0, y0, x1, y1)]
+        cells += [[other.x - x0, other.y - y0, "player"] for other in self.players.query(x0, y0, x1, y1) if other is not player]
+        cells.append([player.x - x0, player.y - y0, "you"])
+        return {
+            "origin": [x0, y0],
+            "cells": cells,
+            "you": {"health": player.health, "max_health": player.max_health, "level": player.level,
+                    "xp": player.xp, "gold": player.gold, "weapon": player.weapon,
+                    "effects": [[e.name, e.power, e.turns] for e in player.effects]},
+            "engaged": session.engaged.enemy_type if session.engaged is not None else None,
+            "messages": session.messages,
+        }
+
+    def send_snapshots(self):
+        for session in list(self.sessions.values()):
+            data = json.dumps(self.snapshot(session))
+            session.messages = []
+            if data != session.last_snapshot:
+                session.last_snapshot = data
+                session.outbox += data.encode() + b"\n"
+            try:
+                if session.outbox:
+                    sent = session.sock.send(session.outbox)
+                    session.outbox = session.outbox[sent:]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._drop(session)
+                continue
+            # A client that stops reading is cut off instead of stalling the tick;
+            # a defeated one is kept until its GAME OVER snapshot has gone out
+            if len(session.outbox) > self.MAX_OUTBOX:
+                self._drop(session)
+            elif session.defeated and (not session.outbox or self.tick >= session.linger_until):
+                self._drop(session)
+
+def draw_remote_board(snapshot):
+    rows = [[('-', "") for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
+    for x, y, kind in snapshot["cells"]:
+        if 0 <= x < BOARD_WIDTH and 0 <= y < BOARD_HEIGHT:
+            rows[y][x] = board_glyph(kind)
+    you = snapshot["you"]
+    holder = Character(0, 0, you["max_health"], [0])
+    holder.effects = [StatusEffect(*effect) for effect in you["effects"]]
 
-def shop_encounter():
     clear_screen()
-    print_shop_art()
-    create_empty_lines()
-    print(f"Gold: {Player_1.gold}")
+    game_output.write(board_encoder.encode(rows), end="")
     create_empty_lines()
-    print("===============")
-    print("WEAPONS:")
-    for _, (name, dmg_list, price) in weapons.items():
-        owned_marker = Colors.OKGREEN + " [OWNED]" + Colors.ENDC if name in Player_1.owned_weapons else ""
-        equipped_marker = Colors.OKCYAN + " [EQUIPPED]" + Colors.ENDC if name == Player_1.weapon else ""
-        print(f"  {name} | Price: {price}{owned_marker}{equipped_marker}")
-    
-    # Show Fists option
-    equipped_fists = Colors.OKCYAN + " [EQUIPPED]" + Colors.ENDC if Player_1.weapon == "Fists" else ""
-    print(f"  Fists | Always owned{equipped_fists}")
-    
-    print("")
-    print("ITEMS:")
-    print(f"  Potion | Price: 10 (heals 30-50 HP)")
-    print(f"  BigPotion | Price: 25 (heals 50-100 HP)")
-    print(f"  Armor | Price: 50 (+5 armor, blocks 10 dmg per piece, max 10)")
-    print("===============")
-    shop_prompt()
+    game_output.write("===============")
+    game_output.write(Colors.OKGREEN + f"Health: {you['health']}/{you['max_health']}" + Colors.ENDC)
+    for line in effect_status_lines(holder):
+        game_output.write(line)
+    game_output.write("Weapon: " + you["weapon"])
+    game_output.write(Colors.OKBLUE + "Level: " + Colors.ENDC + str(you["level"]))
+    game_output.write(f"XP: {you['xp']}/{you['level'] * 100}")
+    game_output.write(Colors.WARNING + "Gold: " + Colors.ENDC + str(you["gold"]))
+    game_output.write("===============")
+    for message in snapshot["messages"]:
+        game_output.write(message)
+    if snapshot["engaged"]:
+        game_output.write(f"Fighting {snapshot['engaged']} enemy - type attack or run")
 
-def game_over():
-    clear_screen()
-    print(Colors.FAIL + "=" * 40)
-    print("           GAME OVER")
-    print("      You have been defeated!")
-    print("=" * 40 + Colors.ENDC)
-    print("")
-    print(f"Final Level: {Player_1.level}")
-    print(f"Total Gold Collected: {Player_1.total_gold}")
-    print(f"Enemies Defeated: {Player_1.enemies_killed}")
-    print("")
-    print("Thanks for playing X-Man!")
-    sys.exit()
+def run_client(host, port):
+    """Thin client: forwards commands to a WorldServer and draws what it sends back"""
+    sock = socket.create_connection((host, port))
+    state = {"engaged": None, "closed": False}
 
-def spawn_enemy_by_level(player_level):
-    """Determine enemy type based on player level"""
-    if player_level >= 5:
-        rand = random.random()
-        if rand < 0.15:  # 15% darkness (rare)
-            return "darkness"
-        elif rand < 0.40:  # 25% agile
-            return "agile"
-        elif rand < 0.55:  # 15% fire
-            return "fire"
-    elif player_level >= 4:
-        rand = random.random()
-        if rand < 0.3:  # 30% agile
-            return "agile"
-        elif rand < 0.5:  # 20% fire
-            return "fire"
-    return "normal"
+    def receive():
+        for line in sock.makefile("r", encoding="utf-8"):
+            snapshot = json.loads(line)
+            state["engaged"] = snapshot["engaged"]
+            draw_remote_board(snapshot)
+        state["closed"] = True
+        game_output.write("Disconnected from server.")
+
+    threading.Thread(target=receive, name="snapshot-reader", daemon=True).start()
+    try:
+        while not state["closed"]:
+            if isinstance(game_input, LineInput):
+                # Scripts and pipes: forward every line, paced to the server tick
+                commands = [game_input.read_line().strip().lower()]
+                time.sleep(TICK_SECONDS)
+            elif state["engaged"]:
+                commands = [ask()]
+            else:
+                commands = sorted(game_input.poll_keys())
+                if not commands:
+                    continue
+                game_output.pause(0.12)
+            sock.sendall("".join(command + "\n" for command in commands).encode())
+    except (EOFError, OSError):
+        pass
+    finally:
+        sock.close()
 
 # ========================
 # Main
 # ========================
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="X-Man")
+    parser.add_argument("--script", metavar="FILE",
+                        help="play commands from FILE (one per line) without a terminal")
+    parser.add_argument("--pipe", action="store_true",
+                        help="read commands from stdin and draw to stdout as plain streams")
+    parser.add_argument("--events", metavar="FILE",
+                        help="append gameplay events to FILE as gzip-compressed JSONL")
+    parser.add_argument("--colors", choices=("auto", "256", "16", "mono"), default="auto",
+                        help="terminal colour support (default: detect)")
+    parser.add_argument("--frame-stats", action="store_true",
+                        help="show how many bytes each board frame took")
+    parser.add_argument("--memory-report", metavar="FILE",
+                        help="trace memory with tracemalloc and write a summary to FILE on exit (or on SIGUSR1)")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="publish live session stats to FILE, a memory-mapped record updated every turn")
+    parser.add_argument("--practice", action="store_true",
+                        help="practice mode: press U on the board to undo the last turn")
+    parser.add_argument("--serve", metavar="PORT", type=int,
+                        help="host a shared world on localhost:PORT")
+    parser.add_argument("--connect", metavar="HOST:PORT",
+                        help="join a shared world")
+    parser.add_argument("--world", metavar="WxH", default="120x60",
+                        help="shared world size for --serve (default: 120x60)")
+    parser.add_argument("--enemies", metavar="N", type=int, default=40,
+                        help="enemy count for --serve (default: 40)")
+    parser.add_argument("--workers", metavar="N", type=int, default=1,
+                        help="simulate --serve enemies in N region worker processes (default: 1)")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.events:
+        event_log = EventLog(args.events)
+    set_color_mode(detect_color_mode() if args.colors == "auto" else args.colors)
+    show_frame_stats = args.frame_stats
+    if args.memory_report:
+        memory_probe = MemoryProbe(args.memory_report)
+    if args.stats:
+        live_stats = LiveStats(args.stats)
+
+    if args.serve is not None:
+        game_output = TerminalOutput()
+        world_width, _, world_height = args.world.partition("x")
+        WorldServer(int(world_width), int(world_height), args.enemies, workers=args.workers).serve(port=args.serve)
+        sys.exit()
+
+    game_input, game_output = make_ports(args)
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        run_client(host or "127.0.0.1", int(port))
+        sys.exit()
+
     # init world
     Player_1 = Player(4, 4, 100, [25, 22, 21, 30], "Fists", 1, 0, 0)
     
@@ -846,93 +2429,90 @@ if __name__ == "__main__":
 
     clear_screen()
     title_screen()
-    time.sleep(1.2)
+    game_output.pause(1.2)
     clear_screen()
-    print(Colors.OKGREEN + "Press W/A/S/D Keys to Start..." + Colors.ENDC)
+    game_output.write(Colors.OKGREEN + "Press W/A/S/D Keys to Start..." + Colors.ENDC)
 
     # initial draw
     generate_board()
 
     turn_counter = 0
+    if args.practice:  # history only feeds undo
+        world_history.record(turn_counter, Player_1, enemy_list)
+    live_stats.publish(turn_counter, Player_1, enemy_list, 0)
 
-    # Game loop (keyboard polling)
-    while True:
-        moved = False
-
-        if keyboard.is_pressed('w'):
-            for enemy in enemy_list:
-                if not enemy.is_dead:
-                    if 1 < enemy.y < BOARD_HEIGHT - 2:
-                        enemy.y += random.randint(-1, 1)
-                    elif enemy.y <= 1:
-                        enemy.y += 1
-                    elif enemy.y >= BOARD_HEIGHT - 2:
-                        enemy.y -= 1
-                    enemy.y = clamp(enemy.y, 0, BOARD_HEIGHT - 1)
-
-            Player_1.y -= 1
-            Player_1.y = clamp(Player_1.y, 0, BOARD_HEIGHT - 1)
-            moved = True
-
-        if keyboard.is_pressed('s'):
-            for enemy in enemy_list:
-                if not enemy.is_dead:
-                    if 1 < enemy.y < BOARD_HEIGHT - 2:
-                        enemy.y += random.randint(-1, 1)
-                    elif enemy.y <= 1:
-                        enemy.y += 1
-                    elif enemy.y >= BOARD_HEIGHT - 2:
-                        enemy.y -= 1
-                    enemy.y = clamp(enemy.y, 0, BOARD_HEIGHT - 1)
-
-            Player_1.y += 1
-            Player_1.y = clamp(Player_1.y, 0, BOARD_HEIGHT - 1)
-            moved = True
-
-        if keyboard.is_pressed('a'):
-            for enemy in enemy_list:
-                if not enemy.is_dead:
-                    if 1 < enemy.x < BOARD_WIDTH - 2:
-                        enemy.x += random.randint(-1, 1)
-                    elif enemy.x <= 1:
-                        enemy.x += 1
-                    elif enemy.x >= BOARD_WIDTH - 2:
-                        enemy.x -= 1
-                    enemy.x = clamp(enemy.x, 0, BOARD_WIDTH - 1)
-
-            Player_1.x -= 1
-            Player_1.x = clamp(Player_1.x, 0, BOARD_WIDTH - 1)
-            moved = True
-
-        if keyboard.is_pressed('d'):
-            for enemy in enemy_list:
-                if not enemy.is_dead:
-                    if 1 < enemy.x < BOARD_WIDTH - 2:
-                        enemy.x += random.randint(-1, 1)
-                    elif enemy.x <= 1:
-                        enemy.x += 1
-                    elif enemy.x >= BOARD_WIDTH - 2:
-                        enemy.x -= 1
-                    enemy.x = clamp(enemy.x, 0, BOARD_WIDTH - 1)
-
-            Player_1.x += 1
-            Player_1.x = clamp(Player_1.x, 0, BOARD_WIDTH - 1)
-            moved = True
-
-        if moved:
-            turn_counter += 1
-            respawn_enemies()
+    # Game loop (keyboard polling); scripted/streamed input ends it with EOFError
+    try:
+        while True:
+            moved = False
+            keys = game_input.poll_keys()
+            turn_started = time.perf_counter()
+
+            if args.practice and UNDO_KEY in keys and turn_counter - 1 in world_history:
+                turn_counter -= 1
+                world_history.restore(turn_counter, Player_1, enemy_list)
+                live_stats.publish(turn_counter, Player_1, enemy_list)
+                clear_screen()
+                generate_board()
+                game_output.write(Colors.DARK + f"Rewound to turn {turn_counter}" + Colors.ENDC)
+                game_output.pause(0.12)
+                continue
+
+            if 'w' in keys:
+                for enemy in enemy_list:
+                    if not enemy.is_dead:
+                        wander_enemy(enemy, 'y', BOARD_HEIGHT)
+
+                Player_1.y -= 1
+                Player_1.y = clamp(Player_1.y, 0, BOARD_HEIGHT - 1)
+                moved = True
+
+            if 's' in keys:
+                for enemy in enemy_list:
+                    if not enemy.is_dead:
+                        wander_enemy(enemy, 'y', BOARD_HEIGHT)
+
+                Player_1.y += 1
+                Player_1.y = clamp(Player_1.y, 0, BOARD_HEIGHT - 1)
+                moved = True
+
+            if 'a' in keys:
+                for enemy in enemy_list:
+                    if not enemy.is_dead:
+                        wander_enemy(enemy, 'x', BOARD_WIDTH)
+
+                Player_1.x -= 1
+                Player_1.x = clamp(Player_1.x, 0, BOARD_WIDTH - 1)
+                moved = True
+
+            if 'd' in keys:
+                for enemy in enemy_list:
+                    if not enemy.is_dead:
+                        wander_enemy(enemy, 'x', BOARD_WIDTH)
+
+                Player_1.x += 1
+                Player_1.x = clamp(Player_1.x, 0, BOARD_WIDTH - 1)
+                moved = True
+
+            if moved:
+                turn_counter += 1
+                respawn_enemies()
             
-            # When enemies respawn at higher levels, they can become special types
-            for enemy in enemy_list:
-                if not enemy.is_dead and enemy.respawn_timer == 0:
-                    # Check if this is a fresh respawn
-                    if turn_counter % 50 == 0:  # Just respawned
-                        new_type = spawn_enemy_by_level(Player_1.level)
+                # When enemies respawn at higher levels, they can become special types
+                if turn_counter % 50 == 0:  # Just respawned
+                    fresh = [enemy for enemy in enemy_list if not enemy.is_dead and enemy.respawn_timer == 0]
+                    for enemy, new_type in zip(fresh, spawn_enemies_by_level(Player_1.level, len(fresh))):
                         if enemy.enemy_type != "darkness" or new_type == "darkness":
                             enemy.enemy_type = new_type
             
-            clear_screen()
-            generate_board()
-            encounter_check()
-            time.sleep(0.12)
+                clear_screen()
+                generate_board()
+                frame_seconds = time.perf_counter() - turn_started
+                memory_probe.sample("board")
+                encounter_check()
+                if args.practice:
+                    world_history.record(turn_counter, Player_1, enemy_list)
+                live_stats.publish(turn_counter, Player_1, enemy_list, frame_seconds)
+                game_output.pause(0.12)
+    except EOFError:
+        pass